@@ -0,0 +1,144 @@
+from collections import namedtuple
+
+from modules.grid import NONE
+
+VOLUME_MISMATCH = 'volume'
+NO_PLACEMENT = 'placement'
+BAD_REGION = 'region'
+
+Problem = namedtuple('Problem', ['kind', 'message', 'cell'])
+
+
+class Report:
+    """Результат анализа головоломки перед решением.
+    Истинен, если явных противоречий не найдено"""
+
+    def __init__(self):
+        self.problems = []
+
+    def add(self, kind, message, cell=None):
+        self.problems.append(Problem(kind, message, cell))
+
+    def __bool__(self):
+        return not self.problems
+
+    def __str__(self):
+        return '\n'.join(problem.message for problem in self.problems)
+
+
+def analyze(task, blocks):
+    """Проверяет задачу до перебора: сумма объёмов равна числу клеток,
+    у каждого блока есть хотя бы один параллелепипед, а заранее
+    раскрашенные области можно достроить до параллелепипеда.
+
+    blocks - блоки решателя с уже посчитанными параллелепипедами.
+    Блоки раскрашенных областей проверяет _check_regions"""
+    report = Report()
+    _check_volume(task, report)
+
+    for block in blocks:
+        if not block.placements and not block.region:
+            report.add(NO_PLACEMENT,
+                       f'Объём {block.value} в клетке '
+                       f'({block.x}, {block.y}, {block.z}) '
+                       f'не помещается ни в один параллелепипед',
+                       (block.x, block.y, block.z))
+
+    _check_regions(task, report)
+    return report
+
+
+def _check_volume(task, report):
+    volume = sum(mark for mark in task.field.marks if mark != NONE)
+
+    cells = task.size_x * task.size_y * task.size_z
+    if volume != cells:
+        report.add(VOLUME_MISMATCH,
+                   f'Сумма объёмов {volume} не равна числу клеток {cells}')
+
+
+def _check_regions(task, report):
+    """Проверяет заранее раскрашенные области: у каждой ровно одно число,
+    а её можно достроить до параллелепипеда этого объёма"""
+    regions = {}
+    for x in range(task.size_x):
+        for y in range(task.size_y):
+            for z in range(task.size_z):
+                cube = task.field[x][y][z]
+                if cube.is_colored():
+                    regions.setdefault(cube.color, []).append((x, y, z))
+
+    if not regions:
+        return
+
+    busy = _prefix_sums(task)
+    for color, cells in regions.items():
+        marks = [task.field[x][y][z].mark for x, y, z in cells
+                 if task.field[x][y][z].is_marked()]
+        if len(marks) != 1:
+            report.add(BAD_REGION,
+                       f'В области цвета {color} должно быть ровно одно '
+                       f'число, а найдено {len(marks)}', cells[0])
+            continue
+
+        low = tuple(min(cell[i] for cell in cells) for i in range(3))
+        high = tuple(max(cell[i] for cell in cells) for i in range(3))
+        if (_count(busy, low, high) != len(cells) or
+                not _can_complete(task, busy, low, high,
+                                  marks[0], len(cells))):
+            report.add(BAD_REGION,
+                       f'Область цвета {color} нельзя достроить '
+                       f'до параллелепипеда объёма {marks[0]}', cells[0])
+
+
+def _can_complete(task, busy, low, high, volume, own):
+    """Есть ли параллелепипед объёма volume, содержащий [low, high]
+    и не задевающий чужих клеток"""
+    sizes = (task.size_x, task.size_y, task.size_z)
+    need = tuple(high[i] - low[i] + 1 for i in range(3))
+    for sx in range(need[0], sizes[0] + 1):
+        if volume % sx:
+            continue
+        for sy in range(need[1], sizes[1] + 1):
+            if volume % (sx * sy):
+                continue
+            sz = volume // (sx * sy)
+            if not need[2] <= sz <= sizes[2]:
+                continue
+            for x in range(max(0, high[0] - sx + 1),
+                           min(low[0], sizes[0] - sx) + 1):
+                for y in range(max(0, high[1] - sy + 1),
+                               min(low[1], sizes[1] - sy) + 1):
+                    for z in range(max(0, high[2] - sz + 1),
+                                   min(low[2], sizes[2] - sz) + 1):
+                        if _count(busy, (x, y, z),
+                                  (x + sx - 1, y + sy - 1,
+                                   z + sz - 1)) == own:
+                            return True
+    return False
+
+
+def _prefix_sums(task):
+    """Трёхмерные префиксные суммы занятых (раскрашенных или
+    отмеченных числом) клеток"""
+    sums = [[[0] * (task.size_z + 1) for _ in range(task.size_y + 1)]
+            for _ in range(task.size_x + 1)]
+    for x in range(task.size_x):
+        for y in range(task.size_y):
+            for z in range(task.size_z):
+                cube = task.field[x][y][z]
+                sums[x + 1][y + 1][z + 1] = (
+                    (cube.is_colored() or cube.is_marked()) +
+                    sums[x][y + 1][z + 1] + sums[x + 1][y][z + 1] +
+                    sums[x + 1][y + 1][z] - sums[x][y][z + 1] -
+                    sums[x][y + 1][z] - sums[x + 1][y][z] + sums[x][y][z])
+    return sums
+
+
+def _count(sums, low, high):
+    """Число занятых клеток в параллелепипеде [low, high]"""
+    x1, y1, z1 = low
+    x2, y2, z2 = high[0] + 1, high[1] + 1, high[2] + 1
+    return (sums[x2][y2][z2] - sums[x1][y2][z2] - sums[x2][y1][z2] -
+            sums[x2][y2][z1] + sums[x1][y1][z2] + sums[x1][y2][z1] +
+            sums[x2][y1][z1] - sums[x1][y1][z1])
@@ -0,0 +1,285 @@
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+
+from modules.solver import (Solver, Budget, ProgressReporter, UNKNOWN,
+                            CHECK_STEPS)
+from modules.task import Task
+
+WAIT_INTERVAL = 0.05
+OPTIONS = ('ordering', 'placement_order', 'propagate', 'components')
+
+
+def _send(stream, message):
+    stream.write(json.dumps(message).encode('utf-8') + b'\n')
+    stream.flush()
+
+
+def _receive(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError('Соединение закрыто')
+    return json.loads(line.decode('utf-8'))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Обслуживает одного исполнителя"""
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = coordinator.register()
+        try:
+            while True:
+                message = _receive(self.rfile)
+                _send(self.wfile, coordinator.dispatch(worker, message))
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            coordinator.lost(worker)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class DistributedSolver(Solver):
+    """Координатор распределённого перебора.
+
+    Дерево поиска делится на поддеревья (префиксы из номеров
+    параллелепипедов, см. Solver.split), которые раздаются исполнителям
+    по TCP (address - пара (хост, порт)) или Unix-сокету (address - путь).
+    Если очередь поддеревьев пуста, а кто-то ещё занят, координатор
+    просит занятого исполнителя отдать часть своей работы.
+    Исполнители запускаются функцией run_worker на любых машинах,
+    кроме того, workers исполнителей координатор запускает сам
+    (по умолчанию - по числу процессоров, 0 - только внешние)"""
+
+    def __init__(self, task, address=('127.0.0.1', 0), workers=None,
+                 levels=2):
+        super().__init__(task)
+        self.address = address
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.levels = levels
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._queue = deque()
+        self._assigned = {}
+        self._steal = set()
+        self._count = 0
+        self._options = {}
+        self._numbers = None
+        self._solved = 0
+
+    def solve(self, timeout=None, cancel=None, on_progress=None, **options):
+        """Параметры - как у Solver.solve, кроме memo, nodes
+        и progress_steps. Порядок перебора параллелепипедов передаётся
+        исполнителям и задаётся только именем"""
+        if callable(options.get('placement_order')):
+            raise ValueError('Порядок перебора для исполнителей '
+                             'задаётся именем')
+        self._options = {key: value for key, value in options.items()
+                         if key in OPTIONS}
+        self._clear_solution()
+        if not self.report:
+            return False
+        self._done.clear()
+        self._assigned.clear()
+        self._steal.clear()
+        self._numbers = None
+        self._solved = 0
+        self.partial = []
+        budget = Budget(timeout, cancel=cancel)
+        reporter = ProgressReporter(on_progress)
+        self._queue = deque(self.split(self.levels, **{
+            key: value for key, value in self._options.items()
+            if key != 'components'}))
+        if not self._queue:
+            self._finished = False
+            return False
+
+        server = self.serve()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        processes = [multiprocessing.Process(target=run_worker,
+                                             args=(server.server_address,),
+                                             daemon=True)
+                     for _ in range(self.workers)]
+        for process in processes:
+            process.start()
+
+        aborted = False
+        try:
+            while not self._done.is_set():
+                if budget.exhausted():
+                    aborted = True
+                    self._done.set()
+                self._done.wait(WAIT_INTERVAL)
+                reporter.advance(self, 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+
+        if self._numbers is None:
+            self._finished = UNKNOWN if aborted else False
+            return self._finished
+        self.apply_placements(self._numbers)
+        return True
+
+    def serve(self):
+        """Создаёт сервер координатора на self.address"""
+        if isinstance(self.address, str):
+            server = _UnixServer(self.address, _Handler)
+        else:
+            server = _TCPServer(tuple(self.address), _Handler)
+        server.coordinator = self
+        return server
+
+    def register(self):
+        with self._lock:
+            self._count += 1
+            return self._count
+
+    def dispatch(self, worker, message):
+        """Отвечает на сообщение исполнителя"""
+        kind = message['type']
+        with self._lock:
+            if kind == 'hello':
+                return {'type': 'task', 'task': str(Task(self.task.field)),
+                        'options': self._options}
+            if kind == 'get':
+                return self._next_work(worker)
+            if kind == 'progress':
+                if self._done.is_set():
+                    return {'type': 'stop'}
+                if worker in self._steal:
+                    self._steal.discard(worker)
+                    return {'type': 'donate'}
+                return {'type': 'continue'}
+            if kind == 'donation':
+                self._queue.extend(message['prefixes'])
+                return {'type': 'continue'}
+            if kind == 'result':
+                self._report(worker, message['numbers'])
+                return {'type': 'ok'}
+        raise ValueError(f'Неизвестное сообщение: {kind}')
+
+    def lost(self, worker):
+        """Исполнитель отключился: его поддерево возвращается в очередь"""
+        with self._lock:
+            self._steal.discard(worker)
+            if worker in self._assigned:
+                self._queue.appendleft(self._assigned.pop(worker))
+
+    def _next_work(self, worker):
+        if self._done.is_set():
+            return {'type': 'stop'}
+        if self._queue:
+            prefix = self._queue.popleft()
+            self._assigned[worker] = prefix
+            return {'type': 'work', 'prefix': prefix}
+        if not self._assigned:
+            self._done.set()
+            return {'type': 'stop'}
+
+        busy = [other for other in self._assigned if other not in self._steal]
+        if busy:
+            self._steal.add(busy[0])
+        return {'type': 'wait'}
+
+    def progress(self):
+        """Доля законченных поддеревьев среди всех,
+        известных координатору"""
+        if self._finished is not None:
+            return 1.0
+        with self._lock:
+            total = self._solved + len(self._queue) + len(self._assigned)
+            return self._solved / total if total else 0.0
+
+    def _report(self, worker, numbers):
+        self._solved += 1
+        self._assigned.pop(worker, None)
+        self._steal.discard(worker)
+        if numbers is not None:
+            self._numbers = numbers
+            self._done.set()
+        elif not self._queue and not self._assigned:
+            self._done.set()
+
+
+def _connect(address):
+    if isinstance(address, str):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = tuple(address)
+    connection.connect(address)
+    return connection
+
+
+def run_worker(address):
+    """Исполнитель: получает от координатора задачу и поддеревья,
+    перебирает их и возвращает результат. Завершается, когда
+    координатор останавливает работу или закрывает соединение"""
+    try:
+        _work(address)
+    except ConnectionError:
+        pass
+
+
+def _work(address):
+    with _connect(address) as connection:
+        stream = connection.makefile('rwb')
+        _send(stream, {'type': 'hello'})
+        message = _receive(stream)
+        solver = Solver(Task.fromstr(message['task']))
+        options = message['options']
+
+        while True:
+            _send(stream, {'type': 'get'})
+            message = _receive(stream)
+            if message['type'] == 'stop':
+                return
+            if message['type'] == 'wait':
+                time.sleep(WAIT_INTERVAL)
+                continue
+
+            solver.start(prefix=message['prefix'], **options)
+            result = solver.resume(CHECK_STEPS)
+            while result is None:
+                _send(stream, {'type': 'progress'})
+                reply = _receive(stream)
+                if reply['type'] == 'stop':
+                    return
+                if reply['type'] == 'donate':
+                    _send(stream, {'type': 'donation',
+                                   'prefixes': solver.donate()})
+                    _receive(stream)
+                result = solver.resume(CHECK_STEPS)
+
+            _send(stream, {'type': 'result',
+                           'numbers': solver.chosen() if result else None})
+            _receive(stream)
+
+
+def parse_address(text):
+    """'хост:порт' - адрес TCP, всё остальное - путь к Unix-сокету"""
+    host, separator, port = text.rpartition(':')
+    if separator and port.isdigit():
+        return host or '127.0.0.1', int(port)
+    return text
@@ -0,0 +1,229 @@
+import time
+
+from modules.grid import NONE
+from modules.solver import (Solver, Budget, ProgressReporter, UNKNOWN,
+                            PROGRESS_INTERVAL)
+
+
+class DancingLinksSolver(Solver):
+    """Решатель Shikaku через точное покрытие (алгоритм X Кнута
+    на пляшущих ссылках)
+
+    Столбцы матрицы - блоки и свободные клетки поля, строки - допустимые
+    параллелепипеды блоков. Каждый блок должен получить ровно
+    один параллелепипед, каждая клетка - быть покрытой ровно один раз.
+    """
+
+    def __init__(self, task):
+        super().__init__(task)
+        self._path = []
+        self._build_matrix()
+
+    def solve(self, timeout=None, nodes=None, cancel=None, on_progress=None,
+              progress_steps=None, progress_interval=PROGRESS_INTERVAL):
+        """Решает головоломку алгоритмом X с выбором
+        самого короткого столбца. Ограничения перебора и сообщения
+        о его ходе - как у Solver.solve"""
+        self._clear_solution()
+        self._finished = None
+        self.partial = []
+        self.nodes = 0
+        self._started = time.perf_counter()
+        if not self.report:
+            self._finished = False
+            return False
+
+        left, right, down = self._left, self._right, self._down
+        column = self._column
+
+        budget = Budget(timeout, nodes, cancel)
+        reporter = ProgressReporter(on_progress, progress_steps,
+                                    progress_interval)
+        if budget.exhausted():
+            return self._abort([], None)
+        limit = min(budget.steps(), reporter.steps())
+        steps = 0
+
+        chosen = self._path = []
+        c = self._choose_column()
+        if c is None:
+            return self._apply(chosen)
+        self._cover(c)
+        r = down[c]
+
+        while True:
+            if steps == limit:
+                budget.spend(steps)
+                reporter.advance(self, steps)
+                if budget.exhausted():
+                    return self._abort(chosen, c)
+                limit = min(budget.steps(), reporter.steps())
+                steps = 0
+            steps += 1
+
+            if r == c:
+                self._uncover(c)
+                if not chosen:
+                    self._finished = False
+                    return False
+                r = chosen.pop()
+                c = column[r]
+                j = left[r]
+                while j != r:
+                    self._uncover(column[j])
+                    j = left[j]
+                r = down[r]
+                continue
+
+            self.nodes += 1
+            j = right[r]
+            while j != r:
+                self._cover(column[j])
+                j = right[j]
+            chosen.append(r)
+            if len(chosen) > len(self.partial):
+                self.partial = [self._rows[row].number for row in chosen]
+
+            c = self._choose_column()
+            if c is None:
+                return self._apply(chosen)
+            self._cover(c)
+            r = down[c]
+
+    def progress(self):
+        """Оценка доли перебранного дерева, как у Solver.progress:
+        у каждой выбранной строки считается, сколько строк
+        её столбца перед ней уже перебрано"""
+        if self._finished is not None:
+            return 1.0
+
+        done = 0.0
+        share = 1.0
+        for r in self._path:
+            c = self._column[r]
+            finished = 0
+            i = self._down[c]
+            while i != r:
+                finished += 1
+                i = self._down[i]
+            done += share * finished / self._size[c]
+            share /= self._size[c]
+        return min(done, 1.0)
+
+    def _build_matrix(self):
+        """Строит разреженную матрицу точного покрытия"""
+        cells = {}
+        colors = self.task.field.colors
+        for x in range(self.task.size_x):
+            for y in range(self.task.size_y):
+                for z in range(self.task.size_z):
+                    if colors[self.task.index(x, y, z)] == NONE:
+                        cells[(x, y, z)] = len(cells)
+
+        columns = len(self._blocks) + len(cells)
+        self._left = [columns] + list(range(columns))
+        self._right = list(range(1, columns + 1)) + [0]
+        self._up = list(range(columns + 1))
+        self._down = list(range(columns + 1))
+        self._column = list(range(columns + 1))
+        self._size = [0] * (columns + 1)
+        self._rows = [None] * (columns + 1)
+
+        for number, block in enumerate(self._blocks):
+            for parallelepiped in block.placements:
+                indexes = [number + 1]
+                for x, y, z in parallelepiped.cells():
+                    if (x, y, z) in cells:
+                        indexes.append(
+                            len(self._blocks) + cells[(x, y, z)] + 1)
+                self._add_row(indexes, parallelepiped)
+
+    def _add_row(self, indexes, parallelepiped):
+        first = len(self._column)
+        for n, c in enumerate(indexes):
+            node = first + n
+            self._column.append(c)
+            self._rows.append(parallelepiped)
+            self._up.append(self._up[c])
+            self._down.append(c)
+            self._down[self._up[c]] = node
+            self._up[c] = node
+            last = first + len(indexes) - 1
+            self._left.append(node - 1 if node > first else last)
+            self._right.append(node + 1 if node < last else first)
+            self._size[c] += 1
+
+    def _choose_column(self):
+        """Возвращает столбец с наименьшим числом строк
+        или None, если покрытие найдено"""
+        right, size = self._right, self._size
+        best = None
+        c = right[0]
+        while c != 0:
+            if best is None or size[c] < size[best]:
+                best = c
+                if size[c] < 2:
+                    break
+            c = right[c]
+        return best
+
+    def _cover(self, c):
+        left, right, up, down = self._left, self._right, self._up, self._down
+        column, size = self._column, self._size
+
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def _uncover(self, c):
+        left, right, up, down = self._left, self._right, self._up, self._down
+        column, size = self._column, self._size
+
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    def _apply(self, chosen):
+        """Переносит выбранные строки в решение задачи
+        и возвращает матрицу в исходное состояние"""
+        for r in chosen:
+            self._chosen.append(self._rows[r])
+            self._rows[r].fill_ids()
+
+        self._restore(chosen)
+        self._finished = True
+        return True
+
+    def _abort(self, chosen, c):
+        """Прерывает перебор, в котором выбраны строки chosen
+        и покрыт столбец c"""
+        if c is not None:
+            self._uncover(c)
+        self._restore(chosen)
+        self._finished = UNKNOWN
+        return UNKNOWN
+
+    def _restore(self, chosen):
+        """Возвращает матрицу в исходное состояние"""
+        for r in reversed(chosen):
+            j = self._left[r]
+            while j != r:
+                self._uncover(self._column[j])
+                j = self._left[j]
+            self._uncover(self._column[r])
@@ -0,0 +1,22 @@
+from modules.distributed import DistributedSolver
+from modules.dlx import DancingLinksSolver
+from modules.parallel import ParallelSolver
+from modules.portfolio import PortfolioSolver
+from modules.solver import Solver
+
+ENGINES = {
+    'backtracking': Solver,
+    'dlx': DancingLinksSolver,
+    'parallel': ParallelSolver,
+    'portfolio': PortfolioSolver,
+    'distributed': DistributedSolver,
+}
+
+DEFAULT_ENGINE = 'backtracking'
+
+
+def create_solver(task, engine=DEFAULT_ENGINE):
+    """Создаёт решатель по имени движка"""
+    if engine not in ENGINES:
+        raise ValueError(f'Неизвестный решатель: {engine}')
+    return ENGINES[engine](task)
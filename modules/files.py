@@ -0,0 +1,16 @@
+import os
+
+
+def make_folder(path):
+    """Создаёт папку для файла path, если её ещё нет"""
+    folder_path = os.path.dirname(path)
+    if folder_path != '' and not os.path.exists(folder_path):
+        os.makedirs(folder_path)
+
+
+def save_task(filename, task):
+    """Записывает задачу в файл, создавая папку для него"""
+    make_folder(filename)
+
+    with open(filename, 'w') as f:
+        f.write(str(task))
@@ -1,19 +1,28 @@
-from random import randint, choice
-from modules.task import Task
+from itertools import islice
+from random import Random
+
+from modules.task import Task, Box
 from modules.cube import Cube
+from modules.solver import Solver, DYNAMIC_ORDERING
+
+MOVE_ATTEMPTS = 2
 
 
 class Generator:
     """Генератор головоломок Shikaku"""
 
-    def __init__(self):
-        """Создание генератора"""
+    def __init__(self, seed=None):
+        """Создание генератора. При одинаковом seed генерируются
+        одинаковые головоломки"""
+        self._random = Random(seed)
         self._field = None
         self._solution = None
         self._answer = None
+        self._runs = None
 
-    def generate(self, dx, dy, dz):
-        """По указанным измерениям генерирует поле и ответ"""
+    def generate(self, dx, dy, dz, unique=False):
+        """По указанным измерениям генерирует поле и ответ.
+        unique - гарантировать, что у головоломки единственное решение"""
         if dx < 1 or dy < 1 or dz < 1:
             raise ValueError
 
@@ -25,48 +34,262 @@ class Generator:
             [[[Cube() for _ in range(dz)]
               for _ in range(dy)] for _ in range(dx)]
         self._answer = []
+        self._runs = _Runs(dx, dy, dz)
         for x in range(dx):
             for y in range(dy):
                 for z in range(dz):
                     if self._solution[x][y][z].is_colored():
                         continue
-                    sx = randint(1, dx - x)
-                    sy = randint(1, dy - y)
-                    sz = randint(1, dz - z)
-                    while self._check_cells(x, y, z, sx, sy, sz):
-                        sx = randint(1, dx - x)
-                        sy = randint(1, dy - y)
-                        sz = randint(1, dz - z)
+                    sx, sy, sz = self._choose_sides(x, y, z)
                     self._generate_answer(x, y, z, sx, sy, sz)
+                    self._occupy_runs(x, y, z, sx, sy, sz)
+            self._runs.release(x)
         self._completion_volume()
+        if unique:
+            self._make_unique()
         return (Task(self._field),
                 Task(self._field, self._solution, self._answer))
 
+    def stream(self, dx, dy, dz, puzzle, solution):
+        """Генерирует головоломку слоями по x и сразу записывает их
+        в открытые файлы puzzle и solution в формате Task.
+
+        В памяти хранятся только слои, до которых дотягиваются уже
+        выбранные блоки, поэтому её расход зависит от наибольшей длины
+        блока по x, а не от размеров поля. Число блока ставится
+        в случайную клетку сразу при его выборе"""
+        if dx < 1 or dy < 1 or dz < 1:
+            raise ValueError
+
+        self._runs = _Runs(dx, dy, dz)
+        colors = {}
+        marks = {}
+        count = 0
+        for x in range(dx):
+            layer = colors.pop(x, None) or \
+                [[None] * dz for _ in range(dy)]
+            for y in range(dy):
+                for z in range(dz):
+                    if layer[y][z] is not None:
+                        continue
+                    sx, sy, sz = self._choose_sides(x, y, z)
+                    self._occupy_runs(x, y, z, sx, sy, sz)
+                    for i in range(sx):
+                        part = layer if not i else colors.setdefault(
+                            x + i, [[None] * dz for _ in range(dy)])
+                        for j in range(sy):
+                            part[y + j][z:z + sz] = [count] * sz
+                    mark = (self._random.randrange(sx),
+                            y + self._random.randrange(sy),
+                            z + self._random.randrange(sz))
+                    marks.setdefault(x + mark[0], {})[mark[1:]] = \
+                        sx * sy * sz
+                    count += 1
+            self._runs.release(x)
+            self._write_layer(x, layer, marks.pop(x, {}), puzzle, solution)
+
+    @staticmethod
+    def _write_layer(x, layer, marks, puzzle, solution):
+        """Записывает готовый слой x головоломки и решения"""
+        if x:
+            puzzle.write('\n\n')
+            solution.write('\n\n')
+        for y, row in enumerate(layer):
+            if y:
+                puzzle.write('\n')
+                solution.write('\n')
+            cubes = [Cube(marks.get((y, z)), color)
+                     for z, color in enumerate(row)]
+            puzzle.write('\t'.join(str(Cube(cube.mark)) for cube in cubes))
+            solution.write('\t'.join(map(str, cubes)))
+
     def _generate_answer(self, x, y, z, sx, sy, sz):
         """Заполняет solution цветами и answer - блоками"""
-        block = []
-        for i in range(sx):
-            for j in range(sy):
-                for k in range(sz):
-                    self._solution[x + i][y + j][z + k].color = \
-                        len(self._answer)
-                    block.append([x + i, y + j, z + k])
-        self._answer.append(block)
+        box = Box(x, y, z, x + sx - 1, y + sy - 1, z + sz - 1,
+                  len(self._answer))
+        for i, j, k in box.cells():
+            self._solution[i][j][k].color = box.color
+        self._answer.append(box)
 
     def _completion_volume(self):
         """Заполняет поле объёмами и пустыми клетками"""
-        for block in self._answer:
-            v = len(block)
-            x, y, z = choice(block)
-            self._field[x][y][z].mark = v
-            self._solution[x][y][z].mark = v
-
-    def _check_cells(self, x, y, z, sx, sy, sz):
-        """Возвращает True, если хотя бы одна клетка
-        в параллелепипеде уже занята"""
+        for box in self._answer:
+            self._put_mark(box)
+
+    def _put_mark(self, box):
+        """Ставит объём блока в его случайную клетку"""
+        x, y, z = (self._random.randint(box.x1, box.x2),
+                   self._random.randint(box.y1, box.y2),
+                   self._random.randint(box.z1, box.z2))
+        self._field[x][y][z].mark = box.volume
+        self._solution[x][y][z].mark = box.volume
+
+    def _make_unique(self):
+        """Пока у головоломки есть другое решение, меняет блоки, которые
+        в нём стоят иначе: переносит число в другую клетку блока, а если
+        это не помогает - делит блок пополам. Затем проверяет только
+        окрестность изменённых блоков (остальные блоки считаются уже
+        поставленными) и лишь потом - всю головоломку"""
+        attempts = {}
+        alternative = self._alternative(set(range(len(self._answer))))
+        while alternative is not None:
+            changed = alternative
+            for number in changed:
+                attempts[number] = attempts.get(number, 0) + 1
+                if attempts[number] > MOVE_ATTEMPTS:
+                    attempts[number] = 0
+                    changed = changed + [self._split_block(number)]
+                else:
+                    self._move_mark(number)
+
+            region = self._neighbourhood(changed)
+            alternative = self._alternative(region)
+            if alternative is None:
+                alternative = self._alternative(set(range(len(self._answer))))
+
+    def _alternative(self, region):
+        """Номера блоков из region, которые в каком-то другом решении
+        стоят иначе, или None, если решение единственно. Блоки вне region
+        считаются уже поставленными"""
+        field = [[[Cube(mark=cube.mark) for cube in row] for row in layer]
+                 for layer in self._field]
+        for number, box in enumerate(self._answer):
+            if number not in region:
+                for x, y, z in box.cells():
+                    field[x][y][z].color = number
+
+        blocks = {self._answer[number].bounds: number for number in region}
+        solver = Solver(Task(field))
+        for solution in islice(solver.solutions(DYNAMIC_ORDERING,
+                                                propagate=True), 2):
+            placed = {box.bounds for box in solution.answer}
+            if placed != set(blocks):
+                return [number for bounds, number in blocks.items()
+                        if bounds not in placed]
+        return None
+
+    def _neighbourhood(self, numbers):
+        """Блоки numbers и блоки, соприкасающиеся с ними"""
+        region = set(numbers)
+        for number in numbers:
+            for x, y, z in self._answer[number].cells():
+                for nx, ny, nz in ((x - 1, y, z), (x + 1, y, z),
+                                   (x, y - 1, z), (x, y + 1, z),
+                                   (x, y, z - 1), (x, y, z + 1)):
+                    if (0 <= nx < len(self._solution) and
+                            0 <= ny < len(self._solution[0]) and
+                            0 <= nz < len(self._solution[0][0])):
+                        region.add(self._solution[nx][ny][nz].color)
+        return region
+
+    def _move_mark(self, number):
+        """Переносит число блока в другую его клетку"""
+        box = self._answer[number]
+        self._set_mark(box, None)
+        self._put_mark(box)
+
+    def _split_block(self, number):
+        """Делит блок пополам вдоль случайной оси длиной больше 1.
+        Вторая половина становится новым блоком, его номер возвращается"""
+        box = self._answer[number]
+        self._set_mark(box, None)
+        axis = self._random.choice([axis for axis in range(3)
+                                    if box[axis + 3] > box[axis]])
+        middle = self._random.randint(box[axis], box[axis + 3] - 1)
+
+        first = box._replace(**{'xyz'[axis] + '2': middle})
+        second = box._replace(**{'xyz'[axis] + '1': middle + 1,
+                                 'color': len(self._answer)})
+        self._answer[number] = first
+        self._answer.append(second)
+        for x, y, z in second.cells():
+            self._solution[x][y][z].color = second.color
+        self._put_mark(first)
+        self._put_mark(second)
+        return second.color
+
+    def _set_mark(self, box, mark):
+        for x, y, z in box.cells():
+            self._field[x][y][z].mark = mark
+            self._solution[x][y][z].mark = mark
+
+    def _choose_sides(self, x, y, z):
+        """Случайные размеры свободного параллелепипеда с углом
+        в (x, y, z), равновероятно среди всех возможных.
+
+        limits[i][j] - наибольшая длина по z при длинах i + 1 и j + 1
+        по x и y: минимум свободных отрезков вдоль z по прямоугольнику.
+        Длины по x и y, для которых она нулевая, не перебираются"""
+        runs = self._runs
+        limits = []
+        total = 0
+        width = len(runs[0]) - y
+        for i in range(len(runs) - x):
+            column = runs[x + i]
+            row = []
+            for j in range(width):
+                limit = column[y + j][z]
+                if j and row[j - 1] < limit:
+                    limit = row[j - 1]
+                if i and limits[i - 1][j] < limit:
+                    limit = limits[i - 1][j]
+                if not limit:
+                    break
+                row.append(limit)
+            if not row:
+                break
+            limits.append(row)
+            total += sum(row)
+            width = len(row)
+
+        pick = self._random.randrange(total)
+        for i, row in enumerate(limits):
+            for j, limit in enumerate(row):
+                if pick < limit:
+                    return i + 1, j + 1, pick + 1
+                pick -= limit
+
+    def _occupy_runs(self, x, y, z, sx, sy, sz):
+        """Обновляет длины свободных отрезков вдоль z после того,
+        как параллелепипед занял клетки"""
         for i in range(sx):
             for j in range(sy):
-                for k in range(sz):
-                    if self._solution[x + i][y + j][z + k].is_colored():
-                        return True
-        return False
+                line = self._runs.layer(x + i)[y + j]
+                for k in range(z, z + sz):
+                    line[k] = 0
+                k = z - 1
+                while k >= 0 and line[k] > z - k:
+                    line[k] = z - k
+                    k -= 1
+
+
+class _Runs:
+    """Длины свободных отрезков вдоль z: self[x][y][z] - сколько
+    свободных клеток подряд начинается с (x, y, z).
+
+    Хранятся только слои, в которых уже заняты клетки: остальные
+    слои полностью свободны и представлены одним общим слоем.
+    Обработанные слои освобождаются методом release"""
+
+    def __init__(self, dx, dy, dz):
+        self._size = dx
+        self._dy = dy
+        self._dz = dz
+        self._free = [list(range(dz, 0, -1))] * dy
+        self._layers = {}
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, x):
+        return self._layers.get(x, self._free)
+
+    def layer(self, x):
+        """Слой x, который можно изменять"""
+        if x not in self._layers:
+            self._layers[x] = [list(range(self._dz, 0, -1))
+                               for _ in range(self._dy)]
+        return self._layers[x]
+
+    def release(self, x):
+        self._layers.pop(x, None)
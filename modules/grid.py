@@ -0,0 +1,231 @@
+from array import array
+
+from modules.cube import Cube
+
+NONE = -1
+MAX_VALUE = 2 ** (8 * array('i').itemsize - 1) - 1
+
+
+class Grid:
+    """Поле головоломки в двух плоских массивах: числа (marks) и цвета
+    (colors) клеток. Отсутствующее значение хранится как NONE.
+    Клетка (x, y, z) лежит в массивах под номером index(x, y, z).
+
+    Для совместимости grid[x][y][z] возвращает представление клетки
+    с теми же полями и методами, что у Cube. Копирование, сравнение
+    и запись в строку выполняются сразу над массивами.
+
+    Копии полей делят массивы, пока одна из них не изменится: массивы
+    marks и colors только читаются, а для записи их возвращают
+    writable_marks и writable_colors, копируя общий массив"""
+
+    def __init__(self, size_x, size_y, size_z, marks=None, colors=None):
+        if size_x < 1 or size_y < 1 or size_z < 1:
+            raise ValueError
+        self.size_x, self.size_y, self.size_z = size_x, size_y, size_z
+        count = size_x * size_y * size_z
+        self._marks = array('i', [NONE]) * count if marks is None else marks
+        self._colors = \
+            array('i', [NONE]) * count if colors is None else colors
+        self._own_marks = self._own_colors = True
+
+    @staticmethod
+    def fromcubes(field):
+        """Поле из вложенных списков Cube"""
+        grid = Grid(len(field), len(field[0]), len(field[0][0]))
+        marks, colors = grid.writable_marks(), grid.writable_colors()
+        index = 0
+        for layer in field:
+            for row in layer:
+                for cube in row:
+                    if cube.mark is not None:
+                        marks[index] = cube.mark
+                    if cube.color is not None:
+                        colors[index] = cube.color
+                    index += 1
+        return grid
+
+    @property
+    def marks(self):
+        return self._marks
+
+    @property
+    def colors(self):
+        return self._colors
+
+    def writable_marks(self):
+        if not self._own_marks:
+            self._marks = self._marks[:]
+            self._own_marks = True
+        return self._marks
+
+    def writable_colors(self):
+        if not self._own_colors:
+            self._colors = self._colors[:]
+            self._own_colors = True
+        return self._colors
+
+    def index(self, x, y, z):
+        """Номер клетки в развёрнутом в одну строку поле"""
+        return (x * self.size_y + y) * self.size_z + z
+
+    def copy(self):
+        """Копия поля. Массивы копируются лишь при первой записи
+        в копию или в исходное поле"""
+        grid = Grid(self.size_x, self.size_y, self.size_z,
+                    self._marks, self._colors)
+        self._own_marks = self._own_colors = False
+        grid._own_marks = grid._own_colors = False
+        return grid
+
+    def window(self, low, high):
+        """Часть поля от клетки low включительно до клетки high
+        не включительно. Клетки не копируются"""
+        return Window(self, low, high)
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __len__(self):
+        return self.size_x
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.size_x:
+            raise IndexError(x)
+        return _Layer(self, x, 0, self.size_y, 0, self.size_z)
+
+    def __iter__(self):
+        for x in range(self.size_x):
+            yield _Layer(self, x, 0, self.size_y, 0, self.size_z)
+
+    def __eq__(self, other):
+        if not isinstance(other, Grid):
+            return NotImplemented
+        return (self.size_x == other.size_x and
+                self.size_y == other.size_y and
+                self.size_z == other.size_z and
+                self._marks == other._marks and
+                self._colors == other._colors)
+
+    def __str__(self):
+        rows = ['\t'.join(map(_token, self._marks[start:start + self.size_z],
+                              self._colors[start:start + self.size_z]))
+                for start in range(0, len(self._marks), self.size_z)]
+        return '\n\n'.join('\n'.join(rows[start:start + self.size_y])
+                            for start in range(0, len(rows), self.size_y))
+
+
+class Window:
+    """Часть поля Grid с тем же доступом к клеткам
+    window[x][y][z], что у Grid"""
+
+    def __init__(self, grid, low, high):
+        if not all(0 <= low[i] < high[i] <= size for i, size in
+                   enumerate((grid.size_x, grid.size_y, grid.size_z))):
+            raise ValueError
+        self._grid = grid
+        self._low = low
+        self.size_x, self.size_y, self.size_z = \
+            (high[i] - low[i] for i in range(3))
+
+    def __len__(self):
+        return self.size_x
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.size_x:
+            raise IndexError(x)
+        return _Layer(self._grid, self._low[0] + x, self._low[1],
+                      self.size_y, self._low[2], self.size_z)
+
+    def __iter__(self):
+        for x in range(self.size_x):
+            yield self[x]
+
+
+def _token(mark, color):
+    """Запись клетки в файле, как у Cube.__str__"""
+    if color == NONE:
+        return '-' if mark == NONE else f'{mark}*'
+    if mark == NONE:
+        return str(color)
+    return f'{color}_{mark}*'
+
+
+class _Layer:
+    """Слой поля с фиксированным x: size_y рядов, начиная с y = low_y,
+    по size_z клеток, начиная с z = low_z"""
+
+    __slots__ = ('_grid', '_x', '_low_y', '_size_y', '_low_z', '_size_z')
+
+    def __init__(self, grid, x, low_y, size_y, low_z, size_z):
+        self._grid = grid
+        self._x = x
+        self._low_y, self._size_y = low_y, size_y
+        self._low_z, self._size_z = low_z, size_z
+
+    def __len__(self):
+        return self._size_y
+
+    def __getitem__(self, y):
+        if not 0 <= y < self._size_y:
+            raise IndexError(y)
+        return _Row(self._grid, self._grid.index(
+            self._x, self._low_y + y, self._low_z), self._size_z)
+
+    def __iter__(self):
+        for y in range(self._size_y):
+            yield self[y]
+
+
+class _Row:
+    """Ряд клеток вдоль z"""
+
+    __slots__ = ('_grid', '_start', '_size')
+
+    def __init__(self, grid, start, size):
+        self._grid = grid
+        self._start = start
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, z):
+        if not 0 <= z < self._size:
+            raise IndexError(z)
+        return CubeView(self._grid, self._start + z)
+
+    def __iter__(self):
+        for index in range(self._start, self._start + self._size):
+            yield CubeView(self._grid, index)
+
+
+class CubeView(Cube):
+    """Клетка Grid с интерфейсом Cube: чтение и запись полей
+    mark и color меняют массивы поля"""
+
+    __slots__ = ('_grid', '_index')
+
+    def __init__(self, grid, index):
+        self._grid = grid
+        self._index = index
+
+    @property
+    def mark(self):
+        mark = self._grid.marks[self._index]
+        return None if mark == NONE else mark
+
+    @mark.setter
+    def mark(self, mark):
+        self._grid.writable_marks()[self._index] = \
+            NONE if mark is None else mark
+
+    @property
+    def color(self):
+        color = self._grid.colors[self._index]
+        return None if color == NONE else color
+
+    @color.setter
+    def color(self, color):
+        self._grid.writable_colors()[self._index] = \
+            NONE if color is None else color
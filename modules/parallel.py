@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED,
+                                wait)
+
+from modules.solver import (Solver, Budget, ProgressReporter, UNKNOWN,
+                            CHECK_STEPS)
+
+WAIT_TIMEOUT = 0.1
+SUBTREES_PER_JOB = 4
+
+_solver = None
+_cancel = None
+
+
+def _init_worker(task, cancel):
+    """Один решатель на процесс-исполнитель: параллелепипеды
+    считаются один раз, а не для каждого поддерева"""
+    global _solver, _cancel
+    _solver = Solver(task)
+    _cancel = cancel
+
+
+def _solve_subtree(prefix, options):
+    """Перебирает одно поддерево в процессе-исполнителе. Возвращает
+    номера параллелепипедов решения, False, если решения в поддереве нет,
+    или None, если перебор отменён"""
+    solver = _solver
+    solver.start(prefix=prefix, **options)
+    result = solver.resume(CHECK_STEPS)
+    while result is None:
+        if _cancel.is_set():
+            return None
+        result = solver.resume(CHECK_STEPS)
+    return solver.chosen() if result else False
+
+
+class ParallelSolver(Solver):
+    """Решатель, перебирающий поддеревья поиска в пуле процессов.
+
+    Верхние уровни дерева перебираются в текущем процессе, пока
+    поддеревьев не станет хотя бы subtrees * jobs, получившиеся поддеревья
+    раздаются jobs процессам. Первое найденное решение останавливает
+    остальные процессы"""
+
+    def __init__(self, task, jobs=None, subtrees=SUBTREES_PER_JOB):
+        super().__init__(task)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.subtrees = subtrees
+        self._subtrees = 0
+        self._subtrees_done = 0
+
+    def solve(self, timeout=None, cancel=None, on_progress=None, **options):
+        """Параметры - как у Solver.solve, кроме nodes и progress_steps.
+        Таблица memo, если задана, копируется в каждый процесс отдельно"""
+        self.partial = []
+        budget = Budget(timeout, cancel=cancel)
+        reporter = ProgressReporter(on_progress)
+        prefixes = self._split(budget, {
+            key: value for key, value in options.items()
+            if key in ('ordering', 'placement_order', 'propagate')})
+        self._subtrees = len(prefixes)
+        self._subtrees_done = 0
+        if not prefixes:
+            self._finished = False
+            return False
+
+        stop = multiprocessing.Event()
+        with ProcessPoolExecutor(max_workers=self.jobs,
+                                 initializer=_init_worker,
+                                 initargs=(self.task, stop)) as executor:
+            futures = [executor.submit(_solve_subtree, prefix, options)
+                       for prefix in prefixes]
+            pending = futures
+            while pending:
+                if budget.exhausted():
+                    self._stop(stop, futures)
+                    self._finished = UNKNOWN
+                    return UNKNOWN
+                done, pending = wait(pending, timeout=WAIT_TIMEOUT,
+                                     return_when=FIRST_COMPLETED)
+                self._subtrees_done += len(done)
+                reporter.advance(self, 0)
+                for future in done:
+                    numbers = future.result()
+                    if isinstance(numbers, list):
+                        self._stop(stop, futures)
+                        self.apply_placements(numbers)
+                        return True
+        self._finished = False
+        return False
+
+    def _split(self, budget, options):
+        """Спускается по дереву на уровень за уровнем, пока поддеревьев
+        меньше subtrees * jobs и не исчерпан budget. Уровни
+        с единственным вариантом не добавляют поддеревьев, поэтому
+        спуск продолжается до ветвления"""
+        prefixes = [()]
+        while (len(prefixes) < self.subtrees * self.jobs and
+               not budget.exhausted()):
+            deeper = [subtree for prefix in prefixes
+                      for subtree in self.split(1, prefix=prefix, **options)]
+            if deeper == prefixes:
+                break
+            prefixes = deeper
+        return prefixes
+
+    def progress(self):
+        """Доля уже перебранных поддеревьев"""
+        if self._finished is not None:
+            return 1.0
+        if not self._subtrees:
+            return 0.0
+        return self._subtrees_done / self._subtrees
+
+    @staticmethod
+    def _stop(stop, futures):
+        stop.set()
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,193 @@
+import multiprocessing
+import time
+from collections import namedtuple
+from queue import Empty
+
+from modules.dlx import DancingLinksSolver
+from modules.solver import (Solver, Budget, ProgressReporter, RandomOrder,
+                            DYNAMIC_ORDERING, UNKNOWN)
+
+Strategy = namedtuple('Strategy', ['name', 'engine', 'options'])
+
+BACKTRACKING = 'backtracking'
+DLX = 'dlx'
+RESTARTS = 'restarts'
+
+STRATEGIES = (
+    Strategy('static', BACKTRACKING, {}),
+    Strategy('dynamic', BACKTRACKING,
+             {'ordering': DYNAMIC_ORDERING, 'propagate': True,
+              'components': True}),
+    Strategy('restarts', RESTARTS,
+             {'ordering': DYNAMIC_ORDERING, 'propagate': True}),
+    Strategy('dlx', DLX, {}),
+)
+
+RESTART_STEPS = 100
+WAIT_TIMEOUT = 0.1
+
+
+def luby(i):
+    """i-й член последовательности Луби: 1 1 2 1 1 2 4 1 1 2 ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+
+def solve_with_restarts(solver, seed=0, steps=RESTART_STEPS, **options):
+    """Перебор со случайным порядком параллелепипедов, который
+    перезапускается после steps * luby(i) шагов"""
+    i = 1
+    while True:
+        solver.start(placement_order=RandomOrder(seed + i), **options)
+        result = solver.resume(steps * luby(i))
+        if result is not None:
+            return result
+        i += 1
+
+
+def _run_strategy(task, strategy, queue):
+    """Решает задачу одной стратегией и кладёт в очередь
+    (имя, результат, номера параллелепипедов, время). Во время перебора
+    в очередь кладётся (имя, оценка доли перебранного дерева)"""
+    def report(solver):
+        queue.put((strategy.name, solver.progress()))
+
+    begin = time.perf_counter()
+    if strategy.engine == DLX:
+        solver = DancingLinksSolver(task)
+        result = solver.solve(on_progress=report, **strategy.options)
+    else:
+        solver = Solver(task)
+        if strategy.engine == RESTARTS:
+            result = solve_with_restarts(solver, **strategy.options)
+        else:
+            result = solver.solve(on_progress=report, **strategy.options)
+    queue.put((strategy.name, result, solver.chosen(),
+               time.perf_counter() - begin))
+
+
+class PortfolioStats:
+    """Сколько раз каждая стратегия участвовала в гонке,
+    сколько раз победила и сколько времени заняли её победы"""
+
+    def __init__(self):
+        self.runs = {}
+        self.wins = {}
+        self.times = {}
+
+    def record(self, names, winner, elapsed):
+        for name in names:
+            self.runs[name] = self.runs.get(name, 0) + 1
+        if winner is not None:
+            self.wins[winner] = self.wins.get(winner, 0) + 1
+            self.times[winner] = self.times.get(winner, 0) + elapsed
+
+    def __str__(self):
+        lines = []
+        for name in sorted(self.runs):
+            wins = self.wins.get(name, 0)
+            average = self.times.get(name, 0) / wins if wins else 0
+            lines.append(f'{name}: {wins}/{self.runs[name]} побед, '
+                         f'в среднем {average:.3f} с')
+        return '\n'.join(lines)
+
+
+class PortfolioSolver(Solver):
+    """Запускает несколько по-разному настроенных решателей
+    в отдельных процессах и берёт ответ того, кто закончил первым.
+    Остальные процессы останавливаются"""
+
+    def __init__(self, task, strategies=STRATEGIES, stats=None):
+        super().__init__(task)
+        self.strategies = strategies
+        self.stats = stats if stats is not None else PortfolioStats()
+        self.winner = None
+        self.elapsed = None
+        self._progress = {}
+
+    def solve(self, timeout=None, cancel=None, on_progress=None):
+        """timeout, cancel и on_progress - как у Solver.solve. Если
+        ограничения исчерпаны раньше, чем ответила хотя бы одна стратегия,
+        возвращается UNKNOWN"""
+        self._clear_solution()
+        self.winner = None
+        self.elapsed = None
+        self.partial = []
+        self._progress = {}
+        self._finished = None
+        if not self.report:
+            self._finished = False
+            return False
+
+        budget = Budget(timeout, cancel=cancel)
+        reporter = ProgressReporter(on_progress)
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_run_strategy,
+                                             args=(self.task, strategy, queue),
+                                             daemon=True)
+                     for strategy in self.strategies]
+        for process in processes:
+            process.start()
+
+        try:
+            answer = self._wait(queue, processes, budget, reporter)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+
+        if answer is None:
+            self.stats.record([strategy.name for strategy in self.strategies],
+                              None, None)
+            self._finished = UNKNOWN
+            return UNKNOWN
+
+        name, result, numbers, elapsed = answer
+        self.winner = name
+        self.elapsed = elapsed
+        self.stats.record([strategy.name for strategy in self.strategies],
+                          name, elapsed)
+        if not result:
+            self._finished = False
+            return False
+
+        self.apply_placements(numbers)
+        return True
+
+    def progress(self):
+        """Наибольшая из оценок, присланных стратегиями"""
+        if self._finished is not None:
+            return 1.0
+        return max(self._progress.values(), default=0.0)
+
+    def _wait(self, queue, processes, budget, reporter):
+        """Ждёт первый ответ. Возвращает None, если исчерпан budget.
+        Если все процессы завершились, не дав ответа,
+        бросает RuntimeError"""
+        while True:
+            if budget.exhausted():
+                return None
+            try:
+                message = queue.get(timeout=WAIT_TIMEOUT)
+            except Empty:
+                reporter.advance(self, 0)
+                if not any(process.is_alive() for process in processes):
+                    self._finished = False
+                    raise RuntimeError(
+                        'Ни одна стратегия не смогла решить головоломку')
+                continue
+
+            if len(message) != 2:
+                return message
+            name, progress = message
+            self._progress[name] = progress
+            reporter.advance(self, 0)
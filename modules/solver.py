@@ -1,4 +1,148 @@
-from copy import deepcopy
+import time
+from itertools import islice
+from random import Random
+
+from modules.analyzer import analyze
+from modules.grid import NONE
+from modules.task import Task, Box
+
+STATIC_ORDERING = 'static'
+DYNAMIC_ORDERING = 'dynamic'
+ORDERINGS = (STATIC_ORDERING, DYNAMIC_ORDERING)
+
+ZOBRIST_SEED = 20201
+CHECK_STEPS = 1000
+
+
+class Unknown:
+    """Результат перебора, прерванного по бюджету или отмене:
+    решение не найдено, но и не доказано, что его нет"""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'UNKNOWN'
+
+
+UNKNOWN = Unknown()
+PROGRESS_INTERVAL = 0.1
+
+
+class Budget:
+    """Ограничения перебора: timeout - время в секундах, nodes - число
+    шагов перебора, cancel - флаг отмены (объект с методом is_set,
+    например threading.Event). None - нет ограничения"""
+
+    def __init__(self, timeout=None, nodes=None, cancel=None):
+        self.deadline = (None if timeout is None else
+                         time.perf_counter() + timeout)
+        self.nodes = nodes
+        self.cancel = cancel
+
+    def steps(self):
+        """Сколько шагов можно сделать до следующей проверки"""
+        if self.nodes is None:
+            return CHECK_STEPS
+        return max(min(CHECK_STEPS, self.nodes), 0)
+
+    def spend(self, steps):
+        if self.nodes is not None:
+            self.nodes -= steps
+
+    def exhausted(self):
+        return ((self.nodes is not None and self.nodes <= 0) or
+                (self.deadline is not None and
+                 time.perf_counter() >= self.deadline) or
+                (self.cancel is not None and self.cancel.is_set()))
+
+
+class ProgressReporter:
+    """Вызывает callback(solver) во время перебора: каждые steps шагов
+    и не реже чем раз в interval секунд. None - без такого условия"""
+
+    def __init__(self, callback=None, steps=None,
+                 interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self._limit = steps
+        self._steps = 0
+        self._last = time.perf_counter()
+
+    def steps(self):
+        """Сколько шагов можно сделать до следующей проверки"""
+        if self.callback is None or self._limit is None:
+            return CHECK_STEPS
+        return max(self._limit - self._steps, 1)
+
+    def advance(self, solver, steps):
+        """Учитывает steps сделанных шагов и при необходимости
+        вызывает callback"""
+        if self.callback is None:
+            return
+
+        self._steps += steps
+        now = time.perf_counter()
+        if ((self._limit is not None and self._steps >= self._limit) or
+                (self.interval is not None and
+                 now - self._last >= self.interval)):
+            self._steps = 0
+            self._last = now
+            self.callback(solver)
+
+
+def default_order(solver, depth, placements):
+    """Параллелепипеды в порядке их перечисления"""
+    return placements
+
+
+def least_constraining_order(solver, depth, placements):
+    """Сначала параллелепипеды, отнимающие меньше всего вариантов
+    у остальных блоков"""
+    placements = solver._feasible(placements)
+    others = [q for block in solver._order[depth + 1:]
+              for q in solver._feasible(block.placements)]
+    return sorted(placements,
+                  key=lambda p: sum(1 for q in others if q.mask & p.mask))
+
+
+def constrained_cells_order(solver, depth, placements):
+    """Сначала параллелепипеды, покрывающие клетки, которые
+    можно покрыть меньшим числом способов"""
+    placements = solver._feasible(placements)
+    if solver._propagate:
+        coverage = solver._coverage
+        return sorted(placements,
+                      key=lambda p: min(coverage[i] for i in p.indexes))
+
+    coverage = {}
+    for block in solver._order[depth:]:
+        for q in solver._feasible(block.placements):
+            for index in q.indexes:
+                coverage[index] = coverage.get(index, 0) + 1
+    return sorted(placements,
+                  key=lambda p: min(coverage[index] for index in p.indexes))
+
+
+class RandomOrder:
+    """Случайный порядок параллелепипедов, например для перезапусков
+    перебора с разными seed"""
+
+    def __init__(self, seed=None):
+        self._random = Random(seed)
+
+    def __call__(self, solver, depth, placements):
+        placements = list(placements)
+        self._random.shuffle(placements)
+        return placements
+
+
+PLACEMENT_ORDERS = {
+    'default': default_order,
+    'least_constraining': least_constraining_order,
+    'constrained_cells': constrained_cells_order,
+    'random': RandomOrder(),
+}
 
 
 class Solver:
@@ -6,93 +150,796 @@ class Solver:
 
     def __init__(self, task):
         self.task = task
-        self.task.solution = deepcopy(self.task.field)
+        self.task.solution = self.task.field.copy()
         self.task.answer = []
         self._blocks = self._completion_blocks()
-        self.depth = 0
-        self.status = 0
-        self.max = self._calculate_status()
+        self._placements = []
+        self._completion_placements()
+        self.report = analyze(self.task, self._blocks)
+        self._full = (1 << (self.task.size_x * self.task.size_y *
+                            self.task.size_z)) - 1
+        self._initial_occupied = self._calculate_occupied()
+        self._occupied = self._initial_occupied
+        self._chosen = []
+        self._positions = []
+        self._ordering = STATIC_ORDERING
+        self._placement_order = default_order
+        self._propagate = False
+        self._components = False
+        self.memo = None
+        self._hash = 0
+        self._calculate_zobrist()
+        self._neighbours = self._calculate_neighbours()
+        self._order = list(self._blocks)
+        self._prefix = []
+        self._stack = []
+        self._result = None
+        self._finished = None
+        self.partial = []
+        self.nodes = 0
+        self._started = None
+
+    def solve(self, ordering=STATIC_ORDERING, placement_order='default',
+              propagate=False, components=False, memo=None, timeout=None,
+              nodes=None, cancel=None, on_progress=None, progress_steps=None,
+              progress_interval=PROGRESS_INTERVAL):
+        """Решает головоломку Shikaku. Занятость поля хранится битовой
+        маской, поэтому проверка и установка параллелепипеда - это
+        пара операций над целым числом.
+
+        ordering - порядок перебора блоков: STATIC_ORDERING (по убыванию
+        объёма) или DYNAMIC_ORDERING (сначала блок с наименьшим числом
+        допустимых параллелепипедов на единицу объёма).
+
+        placement_order - порядок перебора параллелепипедов внутри блока:
+        имя из PLACEMENT_ORDERS или функция (solver, depth, placements),
+        возвращающая параллелепипеды в нужном порядке.
+
+        propagate - для каждой непокрытой клетки поддерживать число
+        параллелепипедов, которые ещё могут её покрыть. Клетка без
+        вариантов сразу даёт откат, клетка с единственным вариантом
+        заставляет поставить этот параллелепипед.
+
+        components - если свободные клетки распались на несвязные
+        области, решать каждую область отдельно. Неудача в одной области
+        сразу даёт откат, без перебора вариантов в остальных.
+
+        memo - TranspositionTable для состояний, про которые уже доказано,
+        что решения нет. Счётчики и объём памяти доступны через
+        self.memo.stats()
+
+        timeout, nodes, cancel - ограничения перебора (см. Budget).
+        Если они исчерпаны раньше, чем перебор закончился, возвращается
+        UNKNOWN, а номера параллелепипедов самой глубокой найденной
+        частичной расстановки остаются в self.partial
+
+        on_progress(solver) вызывается во время перебора каждые
+        progress_steps шагов и не реже чем раз в progress_interval секунд
+        (см. ProgressReporter). Вызов идёт из потока перебора
+
+        Если предварительный анализ (self.report) нашёл противоречие,
+        перебор не запускается"""
+        self.start(ordering, placement_order, propagate, components, memo)
+        budget = Budget(timeout, nodes, cancel)
+        reporter = ProgressReporter(on_progress, progress_steps,
+                                    progress_interval)
+        while True:
+            if budget.exhausted():
+                return self.abort()
+            steps = min(budget.steps(), reporter.steps())
+            result = self.resume(steps)
+            if result is not None:
+                return result
+            budget.spend(steps)
+            reporter.advance(self, steps)
+
+    def start(self, ordering=STATIC_ORDERING, placement_order='default',
+              propagate=False, components=False, memo=None, prefix=()):
+        """Готовит перебор, не запуская его. Параметры - как у solve.
+        prefix - номера параллелепипедов, которые ставятся до начала
+        перебора (так перебирается одно поддерево, см. split).
+        Сам перебор выполняет resume"""
+        if self._prepare(ordering, placement_order, propagate, components,
+                         memo, prefix):
+            self._enter(None)
+
+    def _prepare(self, ordering, placement_order, propagate, components,
+                 memo, prefix):
+        """Сбрасывает состояние перебора и ставит параллелепипеды prefix.
+        Возвращает False, если уже ясно, что решения нет"""
+        if ordering not in ORDERINGS:
+            raise ValueError(f'Неизвестный порядок перебора: {ordering}')
+        if not callable(placement_order):
+            if placement_order not in PLACEMENT_ORDERS:
+                raise ValueError(
+                    f'Неизвестный порядок параллелепипедов: '
+                    f'{placement_order}')
+            placement_order = PLACEMENT_ORDERS[placement_order]
+
+        self._ordering = ordering
+        self._placement_order = placement_order
+        self._prefix = list(prefix)
+        self._propagate = propagate
+        self._components = components
+        self.memo = memo
+        self._clear_solution()
+        self._stack = []
+        self._result = None
+        self._finished = None
+        self.partial = []
+        self.nodes = 0
+        self._started = time.perf_counter()
+        if not self.report:
+            self._finished = False
+            return False
+
+        self._order = list(self._blocks)
+        for position, block in enumerate(self._order):
+            block.position = position
+        self._occupied = self._initial_occupied
+        self._hash = 0
+
+        if propagate:
+            self._init_propagation()
+            if not self._propagate_cells(list(self._coverage_cells())):
+                self._undo(0, 0)
+                self._finished = False
+                return False
+
+        for number in prefix:
+            parallelepiped = self._placements[number]
+            if (parallelepiped.mask & self._occupied or
+                    not self._place(parallelepiped)):
+                self._undo(0, 0)
+                self._finished = False
+                return False
+        return True
+
+    def solutions(self, ordering=STATIC_ORDERING, placement_order='default',
+                  propagate=False):
+        """Лениво перечисляет все решения головоломки. Каждое решение -
+        отдельная задача Task с заполненными solution и answer, сама
+        задача self.task не меняется. Параметры - как у solve; связные
+        области и таблица memo при перечислении не используются"""
+        for _ in self._enumerate(ordering, placement_order, propagate):
+            yield self._solution_task()
+
+    def count_solutions(self, limit=2, ordering=STATIC_ORDERING,
+                        placement_order='default', propagate=True):
+        """Считает решения, останавливаясь на limit-м (None - считать
+        все). По умолчанию - с распространением ограничений.
+        count_solutions() == 1 - решение единственно"""
+        count = 0
+        for _ in self._enumerate(ordering, placement_order, propagate):
+            count += 1
+            if count == limit:
+                break
+        return count
+
+    def _enumerate(self, ordering, placement_order, propagate):
+        """Перебор, который не останавливается на первом решении:
+        после каждого найденного решения отдаёт управление и продолжает
+        так, будто решение не подошло"""
+        self.start(ordering, placement_order, propagate)
+        stack = self._stack
+        if not stack and self._result:
+            yield
+        while stack:
+            self._step_node(stack[-1])
+            if self._result:
+                yield
+                self._result = False
+        if self._finished is None:
+            self._undo(0, 0)
+            self._finished = False
+
+    def _solution_task(self):
+        """Задача с решением из поставленных параллелепипедов"""
+        solution = self.task.solution.copy()
+        answer = list(self.task.answer)
+        colors = solution.writable_colors()
+        for parallelepiped in self._chosen:
+            for index in parallelepiped.indexes:
+                colors[index] = parallelepiped.block.color
+            answer.append(parallelepiped.box())
+        return Task(self.task.field, solution, answer)
+
+    def split(self, levels, ordering=STATIC_ORDERING,
+              placement_order='default', propagate=False, prefix=()):
+        """Перечисляет поддеревья перебора: префиксы из номеров
+        параллелепипедов, выбранных на первых levels уровнях после prefix.
+        Каждое поддерево можно перебрать отдельно через start(prefix=...).
+        Перебор после split нужно начинать заново через start"""
+        prefixes = []
+        start = len(prefix)
+
+        def walk(prefix):
+            depth = len(self._chosen)
+            if len(prefix) >= start + levels or depth >= len(self._order):
+                prefixes.append(tuple(prefix))
+                return
+
+            trail = len(self._trail) if self._propagate else 0
+            candidates = self._placement_order(
+                self, depth, self._candidates(depth))
+            for parallelepiped in candidates:
+                if parallelepiped.mask & self._occupied:
+                    continue
+                if self._place(parallelepiped):
+                    walk(prefix + [parallelepiped.number])
+                self._undo(depth, trail)
+
+        if self._prepare(ordering, placement_order, propagate, False, None,
+                         prefix):
+            walk(list(prefix))
+            self._undo(0, 0)
+        return prefixes
+
+    def donate(self):
+        """Отдаёт часть ещё не перебранных вариантов самого верхнего
+        кадра стека. Возвращает префиксы отданных поддеревьев для
+        start(prefix=...); сам решатель их больше не перебирает.
+
+        В префикс попадают только выбранные в кадрах параллелепипеды:
+        поставленные распространением ограничений повторятся сами"""
+        for i, frame in enumerate(self._stack):
+            if frame.components is not None:
+                continue
+
+            rest = list(frame.candidates)
+            keep = rest[:len(rest) // 2]
+            frame.candidates = iter(keep)
+            frame.total = frame.index + len(keep)
+            if len(rest) == len(keep):
+                continue
+
+            base = self._prefix + [self._chosen[parent.depth].number
+                                   for parent in self._stack[:i]
+                                   if parent.components is None]
+            return [base + [parallelepiped.number]
+                    for parallelepiped in rest[len(keep):]]
+        return []
+
+    def chosen(self):
+        """Номера поставленных параллелепипедов"""
+        return [parallelepiped.number for parallelepiped in self._chosen]
+
+    def apply_placements(self, numbers):
+        """Записывает в задачу решение из параллелепипедов
+        с номерами numbers (например, найденное в другом процессе)"""
+        self._clear_solution()
+        for number in numbers:
+            parallelepiped = self._placements[number]
+            self._chosen.append(parallelepiped)
+            parallelepiped.fill_ids()
+        self._stack = []
+        self._finished = True
+
+    def resume(self, steps=None):
+        """Продолжает перебор, начатый start. Если задано steps,
+        останавливается не более чем через steps шагов.
+        Возвращает True (решение найдено и записано в задачу),
+        False (решения нет), None (перебор приостановлен)
+        или UNKNOWN (перебор прерван через abort)"""
+        if self._finished is not None:
+            return self._finished
+
+        stack = self._stack
+        while stack:
+            if steps is not None:
+                if steps <= 0:
+                    return None
+                steps -= 1
+
+            frame = stack[-1]
+            if frame.components is None:
+                self._step_node(frame)
+            else:
+                self._step_components(frame)
+
+        self._finished = self._result
+        if self._result:
+            for parallelepiped in self._chosen:
+                parallelepiped.fill_ids()
+        else:
+            self._undo(0, 0)
+        return self._finished
 
-    def solve(self, block_number=0):
-        """Рекурсивно решает головоломку Shikaku"""
-        if block_number >= len(self._blocks):
+    def progress(self):
+        """Оценка доли уже перебранного дерева поиска, от 0 до 1.
+        Доля узла делится поровну между его вариантами, полностью
+        перебранные варианты засчитываются целиком"""
+        if self._finished is not None:
+            return 1.0
+
+        done = 0.0
+        share = 1.0
+        last = len(self._stack) - 1
+        for i, frame in enumerate(self._stack):
+            if not frame.total:
+                continue
+            finished = frame.index if i == last else frame.index - 1
+            done += share * finished / frame.total
+            share /= frame.total
+        return min(done, 1.0)
+
+    def remaining(self):
+        """Прогноз оставшегося времени перебора в секундах
+        или None, пока оценивать не по чему"""
+        progress = self.progress()
+        if progress >= 1:
+            return 0.0
+        if self._started is None or progress <= 0:
+            return None
+        elapsed = time.perf_counter() - self._started
+        return elapsed * (1 - progress) / progress
+
+    def abort(self):
+        """Прерывает начатый перебор и возвращает UNKNOWN. Недоперебранные
+        узлы не считаются неудачными и в memo не попадают"""
+        if self._finished is not None:
+            return self._finished
+
+        self._stack = []
+        self._undo(0, 0)
+        self._finished = UNKNOWN
+        return UNKNOWN
+
+    def _clear_solution(self):
+        """Стирает из задачи решение, найденное прошлым вызовом solve.
+        Незаконченный перебор просто забывается"""
+        if self._finished:
+            while self._chosen:
+                self._chosen.pop().clear_ids()
+        self._chosen.clear()
+        self._positions.clear()
+
+    def _enter(self, scope):
+        """Начинает поиск в узле: либо сразу получает результат
+        в self._result, либо кладёт на стек новый кадр.
+        scope - блоки текущей связной области или None, если
+        перебираются все оставшиеся блоки"""
+        key = self._hash
+        depth = len(self._chosen)
+        if depth > len(self.partial):
+            self.partial = self.chosen()
+        if self.memo is not None and key in self.memo:
+            self._result = False
+            return
+
+        self._result = None
+        if scope is None:
+            if depth >= len(self._order):
+                self._result = True
+                return
+        else:
+            scope = [block for block in scope if block.position >= depth]
+            if not scope:
+                self._result = True
+                return
+
+        trail = len(self._trail) if self._propagate else 0
+        if self._components:
+            components = self._split(scope)
+            if components is None:
+                self._fail(key)
+                return
+            if len(components) > 1:
+                self._stack.append(
+                    Frame(key, depth, trail, components=components))
+                return
+
+        candidates = self._placement_order(
+            self, depth, self._candidates(depth, scope))
+        if not isinstance(candidates, list):
+            candidates = list(candidates)
+        self._stack.append(Frame(key, depth, trail, scope, candidates))
+
+    def _fail(self, key):
+        """Узел не имеет решения: запоминает это в таблице memo"""
+        self._result = False
+        if self.memo is not None:
+            self.memo.add(key, len(self._chosen))
+
+    def _step_node(self, frame):
+        """Один шаг кадра перебора: берёт очередной
+        параллелепипед блока и спускается глубже"""
+        if self._result:
+            self._stack.pop()
+            return
+        if self._result is False:
+            self._undo(frame.depth, frame.trail)
+
+        for parallelepiped in frame.candidates:
+            frame.index += 1
+            self.nodes += 1
+
+            if parallelepiped.mask & self._occupied:
+                continue
+
+            if self._place(parallelepiped):
+                self._enter(frame.scope)
+            else:
+                self._result = False
+            return
+
+        self._stack.pop()
+        self._fail(frame.key)
+
+    def _step_components(self, frame):
+        """Один шаг кадра связных областей: решает очередную область.
+        Если одна из областей не решается, откатывает все остальные"""
+        if self._result is False:
+            self._undo(frame.depth, frame.trail)
+            self._stack.pop()
+            self._fail(frame.key)
+            return
+
+        if frame.index == len(frame.components):
+            self._stack.pop()
+            self._result = True
+            return
+
+        frame.index += 1
+        self._enter(frame.components[frame.index - 1])
+
+    def _split(self, scope):
+        """Делит свободные клетки области на связные компоненты.
+        Возвращает списки блоков компонент (сначала меньшие) или None,
+        если в какой-то компоненте объём блоков не равен числу клеток"""
+        blocks = self._order[len(self._chosen):] if scope is None else scope
+        clues = 0
+        for block in blocks:
+            clues |= block.clue
+        free = self._full & ~self._occupied
+        if scope is not None:
+            free = self._grow(clues, free)
+
+        components = []
+        while free:
+            component = self._grow(free & -free, free)
+            free &= ~component
+            inside = [block for block in blocks if block.clue & component]
+            if sum(block.value for block in inside) != \
+                    bin(component).count('1'):
+                return None
+            components.append(inside)
+
+        components.sort(key=len)
+        return components
+
+    def _grow(self, seed, free):
+        """Связная область свободных клеток, содержащая seed"""
+        step = self.task.size_z
+        layer = self.task.size_y * self.task.size_z
+        not_first_z, not_last_z, not_first_y, not_last_y = self._neighbours
+        area = seed & free
+        while True:
+            grown = (area | (area << 1 & not_first_z) |
+                     (area >> 1 & not_last_z) |
+                     (area << step & not_first_y) |
+                     (area >> step & not_last_y) |
+                     area << layer | area >> layer) & free
+            if grown == area:
+                return area
+            area = grown
+
+    def _place(self, parallelepiped):
+        """Ставит параллелепипед. Возвращает False, если распространение
+        ограничений нашло противоречие"""
+        self._assign(parallelepiped)
+        if not self._propagate:
             return True
 
-        block = self._blocks[block_number]
+        touched = []
+        if not self._kill_conflicts(parallelepiped, touched):
+            return False
+        return self._propagate_cells(touched)
 
-        for sides in block.sides:
-            for i in range(sides[0]):
-                for j in range(sides[1]):
-                    for k in range(sides[2]):
-                        if block_number <= self.depth:
-                            self.status += 1
+    def _assign(self, parallelepiped):
+        """Занимает клетки параллелепипеда и переносит его блок
+        в начало списка оставшихся блоков"""
+        block = parallelepiped.block
+        depth = len(self._chosen)
+        self._occupied |= parallelepiped.mask
+        self._hash ^= parallelepiped.zobrist
+        self._chosen.append(parallelepiped)
+        self._positions.append(block.position)
+        self._swap(depth, block.position)
 
-                        if (sides[0] > self.task.size_x or
-                                sides[1] > self.task.size_y or
-                                sides[2] > self.task.size_z):
-                            continue
+    def _undo(self, depth, trail):
+        """Откатывает поиск к depth поставленным блокам"""
+        while len(self._chosen) > depth:
+            parallelepiped = self._chosen.pop()
+            self._occupied ^= parallelepiped.mask
+            self._hash ^= parallelepiped.zobrist
+            self._swap(len(self._chosen), self._positions.pop())
 
-                        point1 = Point(block.x + i - sides[0] + 1,
-                                       block.y + j - sides[1] + 1,
-                                       block.z - k)
-                        point2 = Point(block.x + i,
-                                       block.y + j,
-                                       block.z - k + sides[2] - 1)
-
-                        try:
-                            parallelepiped = Parallelepiped(
-                                point1, point2, block, self.task)
-                        except ValueError:
-                            continue
+        if self._propagate:
+            while len(self._trail) > trail:
+                self._revive(self._trail.pop())
 
-                        if not parallelepiped.is_conflict():
-                            parallelepiped.fill_ids()
+    def _swap(self, i, j):
+        order = self._order
+        order[i], order[j] = order[j], order[i]
+        order[i].position = i
+        order[j].position = j
 
-                            if self.solve(block_number + 1):
-                                return True
-                            else:
-                                parallelepiped.clear_ids()
-        return False
+    def _candidates(self, depth, scope=None):
+        """Возвращает параллелепипеды блока, перебираемого на глубине
+        depth, и ставит этот блок на место depth. При динамическом
+        порядке выбирает из оставшихся блоков (или блоков scope)
+        блок с наименьшим числом вариантов на единицу объёма, из равных -
+        самый большой, как при статическом порядке. Блок без вариантов
+        или с одним вариантом берётся сразу, не просматривая остальные"""
+        if self._ordering == STATIC_ORDERING:
+            block = self._order[depth] if scope is None else scope[0]
+            self._swap(depth, block.position)
+            if not self._propagate:
+                return block.placements
+            return self._feasible(block.placements)
+
+        if scope is None:
+            scope = islice(self._order, depth, None)
+
+        best = None
+        best_block = None
+        for block in scope:
+            if self._propagate:
+                count = self._alive_count[block.number]
+            elif best is None:
+                count = self._count_feasible(block.placements)
+            else:
+                count = self._count_feasible(
+                    block.placements, best * block.value // best_block.value)
+            if best is None:
+                better = True
+            else:
+                ours = count * best_block.value
+                theirs = best * block.value
+                better = (ours < theirs or ours == theirs and
+                          block.value > best_block.value)
+            if better:
+                best = count
+                best_block = block
+                if best <= 1:
+                    break
+
+        self._swap(depth, best_block.position)
+        return self._feasible(best_block.placements)
+
+    def _count_feasible(self, placements, limit=None):
+        """Число параллелепипедов, не пересекающихся с занятыми
+        клетками. Счёт останавливается, как только превысит limit"""
+        occupied = self._occupied
+        count = 0
+        for parallelepiped in placements:
+            if not parallelepiped.mask & occupied:
+                count += 1
+                if limit is not None and count > limit:
+                    break
+        return count
+
+    def _feasible(self, placements):
+        """Параллелепипеды, не пересекающиеся с занятыми клетками"""
+        if self._propagate:
+            return [p for p in placements if self._alive[p.number]]
+        return [p for p in placements if not p.mask & self._occupied]
+
+    def _init_propagation(self):
+        """Считает, сколькими параллелепипедами можно покрыть
+        каждую клетку"""
+        self._trail = []
+        self._alive = [True] * len(self._placements)
+        self._alive_count = [len(block.placements) for block in self._blocks]
+        self._coverage = [0] * (self.task.size_x * self.task.size_y *
+                                self.task.size_z)
+        self._cell_placements = [[] for _ in self._coverage]
+        for parallelepiped in self._placements:
+            for index in parallelepiped.indexes:
+                self._coverage[index] += 1
+                self._cell_placements[index].append(parallelepiped)
+
+    def _coverage_cells(self):
+        """Непокрытые клетки поля"""
+        for index in range(len(self._coverage)):
+            if not self._occupied >> index & 1:
+                yield index
+
+    def _kill_conflicts(self, parallelepiped, touched):
+        """Вычёркивает остальные параллелепипеды блока и все
+        параллелепипеды, пересекающиеся с поставленным. Клетки, у которых
+        осталось не больше одного варианта, добавляет в touched"""
+        alive = self._alive
+        for other in parallelepiped.block.placements:
+            if alive[other.number]:
+                self._kill(other, touched)
+
+        for index in parallelepiped.indexes:
+            for other in self._cell_placements[index]:
+                if alive[other.number]:
+                    self._kill(other, touched)
+                    if not self._alive_count[other.block.number]:
+                        return False
+        return True
+
+    def _kill(self, parallelepiped, touched):
+        self._alive[parallelepiped.number] = False
+        self._alive_count[parallelepiped.block.number] -= 1
+        self._trail.append(parallelepiped)
+        coverage = self._coverage
+        for index in parallelepiped.indexes:
+            coverage[index] -= 1
+            if coverage[index] < 2:
+                touched.append(index)
+
+    def _revive(self, parallelepiped):
+        self._alive[parallelepiped.number] = True
+        self._alive_count[parallelepiped.block.number] += 1
+        coverage = self._coverage
+        for index in parallelepiped.indexes:
+            coverage[index] += 1
+
+    def _propagate_cells(self, touched):
+        """Проверяет клетки из touched: клетка без вариантов - противоречие,
+        клетка с одним вариантом - вынужденная постановка"""
+        while touched:
+            index = touched.pop()
+            if self._occupied >> index & 1:
+                continue
+
+            count = self._coverage[index]
+            if not count:
+                return False
+            if count > 1:
+                continue
+
+            for parallelepiped in self._cell_placements[index]:
+                if self._alive[parallelepiped.number]:
+                    break
+            self._assign(parallelepiped)
+            if not self._kill_conflicts(parallelepiped, touched):
+                return False
+        return True
 
     def _completion_blocks(self):
+        """Блоки для чисел без цвета и для недостроенных раскрашенных
+        областей: параллелепипед такого блока должен содержать
+        все клетки его области"""
         blocks = []
         count = 0
         used_colors = set()
-        for x in range(len(self.task.field)):
-            for y in range(len(self.task.field[x])):
-                for z in range(len(self.task.field[x][y])):
-                    if self.task.field[x][y][z].is_marked():
+        regions = {}
+        marks, colors = self.task.field.marks, self.task.field.colors
+        for index, color in enumerate(colors):
+            if color != NONE:
+                regions[color] = regions.get(color, 0) | 1 << index
+
+        for x in range(self.task.size_x):
+            for y in range(self.task.size_y):
+                for z in range(self.task.size_z):
+                    index = self.task.index(x, y, z)
+                    if marks[index] != NONE:
                         count += 1
-                        if not self.task.field[x][y][z].is_colored():
-                            blocks.append(
-                                Block(x, y, z, self.task.field[x][y][z].mark))
-                        else:
-                            used_colors.add(self.task.solution[x][y][z].color)
+                        color = colors[index]
+                        if color == NONE:
+                            blocks.append(Block(x, y, z, marks[index]))
+                            continue
+
+                        used_colors.add(color)
+                        region = regions[color]
+                        if bin(region).count('1') != marks[index]:
+                            block = Block(x, y, z, marks[index], color)
+                            block.region = region
+                            blocks.append(block)
 
         colors = set(range(count)).difference(used_colors)
 
         for block in blocks:
-            block.color = colors.pop()
+            if block.color is None:
+                block.color = colors.pop()
             self.task.solution[block.x][block.y][block.z].color = block.color
 
         blocks.sort(key=lambda b: -b.value)
 
         return blocks
 
-    def _calculate_status(self):
-        if len(self._blocks) < 1:
-            return 0
+    def _completion_placements(self):
+        """Один раз перечисляет для каждого блока все параллелепипеды,
+        которые помещаются в поле и не задевают чужие клетки"""
+        for number, block in enumerate(self._blocks):
+            block.number = number
+            block.clue = 1 << self.task.index(block.x, block.y, block.z)
+            for sides in block.sides:
+                if (sides[0] > self.task.size_x or
+                        sides[1] > self.task.size_y or
+                        sides[2] > self.task.size_z):
+                    continue
 
-        count = self._blocks[0].value * len(self._blocks[0].sides)
-        for i in range(1, len(self._blocks)):
-            pred = count * self._blocks[i].value * len(self._blocks[i].sides)
-            if pred > 10000:
-                self.depth = i - 1
-                return count
-            count = pred
+                for i in range(sides[0]):
+                    for j in range(sides[1]):
+                        for k in range(sides[2]):
+                            point1 = Point(block.x + i - sides[0] + 1,
+                                           block.y + j - sides[1] + 1,
+                                           block.z - k)
+                            point2 = Point(block.x + i,
+                                           block.y + j,
+                                           block.z - k + sides[2] - 1)
 
-        self.depth = len(self._blocks) - 1
-        return count
+                            try:
+                                parallelepiped = Parallelepiped(
+                                    point1, point2, block, self.task)
+                            except ValueError:
+                                continue
+
+                            if (parallelepiped.mask & block.region ==
+                                    block.region and
+                                    not parallelepiped.is_conflict()):
+                                parallelepiped.number = len(self._placements)
+                                block.placements.append(parallelepiped)
+                                self._placements.append(parallelepiped)
+
+    def _calculate_occupied(self):
+        """Битовая маска клеток, раскрашенных ещё до начала решения.
+        Клетки недостроенных областей остаются свободными: их займёт
+        параллелепипед блока области"""
+        occupied = 0
+        for index, color in enumerate(self.task.field.colors):
+            if color != NONE:
+                occupied |= 1 << index
+        for block in self._blocks:
+            occupied &= ~block.region
+        return occupied
+
+    def _calculate_zobrist(self):
+        """Случайные ключи Зобриста: ключ параллелепипеда - это xor
+        ключей его клеток и ключа его блока"""
+        generator = Random(ZOBRIST_SEED)
+        cells = [generator.getrandbits(64) for _ in
+                 range(self.task.size_x * self.task.size_y *
+                       self.task.size_z)]
+        for block in self._blocks:
+            key = generator.getrandbits(64)
+            for parallelepiped in block.placements:
+                parallelepiped.zobrist = key
+                for index in parallelepiped.indexes:
+                    parallelepiped.zobrist ^= cells[index]
+
+    def _calculate_neighbours(self):
+        """Маски клеток, у которых есть сосед с меньшим и с большим z,
+        с меньшим и с большим y. Нужны для сдвигов при поиске
+        связных областей"""
+        masks = [0, 0, 0, 0]
+        for x in range(self.task.size_x):
+            for y in range(self.task.size_y):
+                for z in range(self.task.size_z):
+                    bit = 1 << self.task.index(x, y, z)
+                    if z > 0:
+                        masks[0] |= bit
+                    if z < self.task.size_z - 1:
+                        masks[1] |= bit
+                    if y > 0:
+                        masks[2] |= bit
+                    if y < self.task.size_y - 1:
+                        masks[3] |= bit
+        return tuple(masks)
+
+
+class Frame:
+    """Кадр явного стека перебора: либо блок с итератором его
+    параллелепипедов, либо список связных областей.
+    index - сколько вариантов уже взято, total - сколько их всего"""
+
+    def __init__(self, key, depth, trail, scope=None, candidates=None,
+                 components=None):
+        self.key = key
+        self.depth = depth
+        self.trail = trail
+        self.scope = scope
+        self.candidates = None if candidates is None else iter(candidates)
+        self.components = components
+        self.index = 0
+        self.total = len(candidates if components is None else components)
 
 
 class Block:
@@ -105,6 +952,11 @@ class Block:
         self.value = value
         self.color = color
         self.sides = self._calculate_sides()
+        self.placements = []
+        self.number = None
+        self.position = None
+        self.clue = 0
+        self.region = 0
 
     def _calculate_sides(self):
         """Возвращает всевозможные длины трёх измерений
@@ -135,18 +987,35 @@ class Parallelepiped:
         self.point1 = point1
         self.point2 = point2
         self.block = block
+        self.number = None
+        self.zobrist = 0
+        self.mask = self._calculate_mask()
+        self.indexes = [task.index(x, y, z) for x, y, z in self.cells()]
+
+    def _calculate_mask(self):
+        """Битовая маска клеток параллелепипеда в развёрнутом поле"""
+        row = (1 << (self.point2.z - self.point1.z + 1)) - 1
+        mask = 0
+        for x in range(self.point1.x, self.point2.x + 1):
+            for y in range(self.point1.y, self.point2.y + 1):
+                mask |= row << self.task.index(x, y, self.point1.z)
+        return mask
 
     def is_conflict(self):
         """Возвращает True, если существует конфликт с
         существующим параллелепипедом"""
+        colors = self.task.solution.colors
+        for index in self.indexes:
+            if colors[index] != NONE and colors[index] != self.block.color:
+                return True
+        return False
+
+    def cells(self):
+        """Перечисляет координаты клеток параллелепипеда"""
         for x in range(self.point1.x, self.point2.x + 1):
             for y in range(self.point1.y, self.point2.y + 1):
                 for z in range(self.point1.z, self.point2.z + 1):
-                    if (self.task.solution[x][y][z].is_colored() and
-                            self.task.solution[x][y][z].color !=
-                            self.block.color):
-                        return True
-        return False
+                    yield x, y, z
 
     def fill_ids(self):
         """Заполняет решение идентификатором параллелепипеда(цветом)"""
@@ -154,27 +1023,29 @@ class Parallelepiped:
         self._add_block_in_answer()
 
     def _fill_block(self, color):
-        for x in range(self.point1.x, self.point2.x + 1):
-            for y in range(self.point1.y, self.point2.y + 1):
-                for z in range(self.point1.z, self.point2.z + 1):
-                    self.task.solution[x][y][z].color = color
+        colors = self.task.solution.writable_colors()
+        for index in self.indexes:
+            colors[index] = color
 
     def clear_ids(self):
-        """Стирает идентификатор параллелепипеда с решения"""
-        self._fill_block(None)
+        """Стирает идентификатор параллелепипеда с решения,
+        возвращая клеткам цвета из условия"""
+        colors = self.task.solution.writable_colors()
+        for index in self.indexes:
+            colors[index] = self.task.field.colors[index]
         self._remove_block_from_answer()
         self.task.solution[self.block.x][self.block.y][self.block.z].color = \
             self.block.color
 
+    def box(self):
+        """Блок ответа для параллелепипеда"""
+        return Box(self.point1.x, self.point1.y, self.point1.z,
+                   self.point2.x, self.point2.y, self.point2.z,
+                   self.block.color)
+
     def _add_block_in_answer(self):
         """Добавляет указанный параллелепипед(блок) в ответ"""
-        block = []
-        for x in range(self.point1.x, self.point2.x + 1):
-            for y in range(self.point1.y, self.point2.y + 1):
-                for z in range(self.point1.z, self.point2.z + 1):
-                    block.append([x, y, z])
-
-        self.task.answer.append(block)
+        self.task.answer.append(self.box())
 
     def _remove_block_from_answer(self):
         self.task.answer.pop()
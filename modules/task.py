@@ -1,18 +1,64 @@
-from modules.cube import Cube
+import io
+import re
+from array import array
+from collections import namedtuple
+
+from modules.grid import Grid, NONE, MAX_VALUE
+
+_END = r'(?:[ \t]+|$)'
+_TOKENS = re.compile(r'(-)' + _END + r'|(\d+)_(\d+)\*' + _END +
+                     r'|(\d+)(\*?)' + _END + r'|(.)')
+_PREFIX = re.compile(r'-|\d+(?:_(?:\d+\*?)?|\*)?')
+
+
+class Box(namedtuple('Box', ['x1', 'y1', 'z1', 'x2', 'y2', 'z2', 'color'])):
+    """Блок ответа: параллелепипед цвета color от клетки (x1, y1, z1)
+    до клетки (x2, y2, z2) включительно"""
+
+    __slots__ = ()
+
+    @property
+    def bounds(self):
+        """Углы блока без цвета"""
+        return self[:6]
+
+    @property
+    def volume(self):
+        return ((self.x2 - self.x1 + 1) * (self.y2 - self.y1 + 1) *
+                (self.z2 - self.z1 + 1))
+
+    def cells(self):
+        """Перечисляет координаты клеток блока"""
+        for x in range(self.x1, self.x2 + 1):
+            for y in range(self.y1, self.y2 + 1):
+                for z in range(self.z1, self.z2 + 1):
+                    yield x, y, z
 
 
 class Task:
-    """Класс задачи-головоломки Shikaku"""
+    """Класс задачи-головоломки Shikaku.
 
-    def __init__(self, field, solution=None, answer=None):
-        if self._field_is_empty(field):
-            raise ValueError
+    Поле и решение хранятся в Grid; поля из вложенных списков Cube
+    при создании задачи переводятся в Grid. Ответ - список блоков Box"""
 
-        self.field = field
-        self.solution = solution
+    def __init__(self, field, solution=None, answer=None):
+        self.field = self._grid(field)
+        self.solution = None if solution is None else self._grid(solution)
         self.answer = answer
         self.size_x, self.size_y, self.size_z = \
-            len(field), len(field[0]), len(field[0][0])
+            self.field.size_x, self.field.size_y, self.field.size_z
+
+    @staticmethod
+    def _grid(field):
+        if isinstance(field, Grid):
+            return field
+        if Task._field_is_empty(field):
+            raise ValueError
+        return Grid.fromcubes(field)
+
+    def index(self, x, y, z):
+        """Номер клетки в развёрнутом в одну строку поле"""
+        return (x * self.size_y + y) * self.size_z + z
 
     @staticmethod
     def _field_is_empty(field):
@@ -28,102 +74,96 @@ class Task:
 
     @staticmethod
     def fromstr(text):
+        return Task.fromfile(io.StringIO(text))
 
-        def _message(str_i, ch_i, line, char):
-            return f'строка:символ\n\n{str_i}:{ch_i}\n{line}:{char}'
-
-        p_text = text.split('\n')
-        field = [[]]
-
-        dx = 0
-        dy = 0
-        for j in range(len(p_text)):
-            string = p_text[j]
-            if not string:
-                dx += 1
-                dy = 0
-                field.append([])
+    @staticmethod
+    def fromfile(file):
+        """Читает задачу из текстового файла построчно, не загружая его
+        целиком, и сразу заполняет массивы Grid. Пустая строка
+        начинает следующий слой по x"""
+        marks, colors = array('i'), array('i')
+        sizes = None
+        rows = []
+        x = 0
+        for number, line in enumerate(_lines(file), 1):
+            if not line:
+                sizes = _check_layer(x, rows, sizes)
+                x += 1
+                rows = []
                 continue
 
-            field[dx].append([])
-            digit_str = ''
-            color_with_mark = ''
-            for i in range(len(string)):
-                if (string[i] == '\t' or string[i] == ' ') and i != 0:
-                    if len(digit_str) > 0:
-                        field[dx][dy].append(Cube(color=int(digit_str)))
-                        digit_str = ''
-                    continue
-
-                if (string[i] == '-' and
-                        (i - 1 < 0 or
-                         string[i - 1] == '\t' or
-                         string[i - 1] == ' ')):
-                    if (i + 1 < len(string) and
-                            string[i + 1] != '\t' and
-                            string[i + 1] != ' '):
-                        raise ValueError(
-                            _message(j + 1, i + 2, string, string[i + 1]))
-                    field[dx][dy].append(Cube())
-                elif string[i].isdigit():
-                    digit_str += string[i]
-
-                elif string[i] == '*' and len(digit_str) > 0:
-                    if len(color_with_mark) > 0:
-                        field[dx][dy].append(Cube(color=int(color_with_mark),
-                                                  mark=int(digit_str)))
-                        color_with_mark = ''
-                        digit_str = ''
-                        continue
-                    if (i + 1 < len(string) and
-                            string[i + 1] != '\t' and
-                            string[i + 1] != ' '):
-                        raise ValueError(
-                            _message(j + 1, i + 2, string, string[i + 1]))
-                    field[dx][dy].append(Cube(mark=int(digit_str)))
-                    digit_str = ''
-
-                elif string[i] == '_' and len(digit_str) > 0:
-                    color_with_mark = digit_str
-                    digit_str = ''
-
-                else:
-                    raise ValueError(
-                        _message(j + 1, i + 1, string, string[i]))
-
-            if digit_str != '':
-                field[dx][dy].append(Cube(color=int(digit_str)))
-
-            dy += 1
-
-        count_dy = len(field[0])
-        count_dz = len(field[0][0])
-        for x in range(len(field)):
-            if len(field[x]) != count_dy:
-                raise ValueError(
-                    f'Это не параллелепипед при x = {x}')
-            for y in range(len(field[x])):
-                if len(field[x][y]) != count_dz:
-                    raise ValueError(
-                        f'Это не параллелепипед при x = {x}, y = {y}')
-
-        return Task(field)
+            tokens = _TOKENS.findall(line)
+            try:
+                for dash, color, color_mark, value, star, error in tokens:
+                    if error:
+                        raise ValueError(_message(number, line))
+                    if dash:
+                        marks.append(NONE)
+                        colors.append(NONE)
+                    elif color:
+                        marks.append(int(color_mark))
+                        colors.append(int(color))
+                    elif star:
+                        marks.append(int(value))
+                        colors.append(NONE)
+                    else:
+                        marks.append(NONE)
+                        colors.append(int(value))
+            except OverflowError:
+                raise ValueError(_message(number, line)) from None
+            rows.append(len(tokens))
+        sizes = _check_layer(x, rows, sizes)
+
+        return Task(Grid(x + 1, sizes[0], sizes[1], marks, colors))
 
     def __str__(self):
-        field = self.solution if self.solution else self.field
-        answer = ''
-        for i in range(len(field)):
-            for j in range(len(field[i])):
-                answer += ('\t'.join(map(str, field[i][j])))
-                if j != len(field[i]) - 1:
-                    answer += '\n'
-            if i != len(field) - 1:
-                answer += '\n\n'
-
-        return answer
+        return str(self.solution if self.solution else self.field)
 
     def __eq__(self, other):
         if not isinstance(other, Task):
             return False
 
         return self.field == other.field
+
+
+def _lines(file):
+    """Строки файла без переводов строки - как text.split('\\n')"""
+    line = ''
+    for line in file:
+        yield line[:-1] if line.endswith('\n') else line
+    if not line or line.endswith('\n'):
+        yield ''
+
+
+def _message(number, line):
+    """Сообщение о первом символе строки, который нельзя разобрать,
+    или о начале числа, которое не помещается в Grid"""
+    position = 0
+    while True:
+        match = _TOKENS.match(line, position)
+        if match.lastindex == 6:
+            match = _PREFIX.match(line, position)
+            if match:
+                position = match.end()
+            break
+        if any(value and int(value) > MAX_VALUE
+               for value in match.group(2, 3, 4)):
+            break
+        position = match.end()
+    return (f'строка:символ\n\n{number}:{position + 1}\n'
+            f'{line}:{line[position:position + 1]}')
+
+
+def _check_layer(x, rows, sizes):
+    """Проверяет длины рядов слоя x. sizes - число рядов и их длина
+    в первом слое; возвращаются они же"""
+    if sizes is None:
+        if not rows:
+            raise ValueError(f'Это не параллелепипед при x = {x}')
+        sizes = len(rows), rows[0]
+    if len(rows) != sizes[0]:
+        raise ValueError(f'Это не параллелепипед при x = {x}')
+    for y, count in enumerate(rows):
+        if count != sizes[1]:
+            raise ValueError(f'Это не параллелепипед при x = {x}, y = {y}')
+    return sizes
@@ -0,0 +1,101 @@
+import sys
+from collections import OrderedDict
+
+LRU = 'lru'
+DEPTH_PREFERRED = 'depth'
+POLICIES = (LRU, DEPTH_PREFERRED)
+
+
+class TranspositionTable:
+    """Таблица состояний перебора, про которые уже известно,
+    что они не имеют решения.
+
+    Состояние задаётся хешем Зобриста занятых клеток и поставленных
+    блоков. Размер таблицы ограничен capacity записями, при переполнении
+    запись вытесняется по политике policy:
+    LRU - вытесняется давно не использованная запись,
+    DEPTH_PREFERRED - таблица из capacity ячеек, в ячейке остаётся
+    состояние с меньшей глубиной (то есть с большим поддеревом)"""
+
+    def __init__(self, capacity=100000, policy=LRU):
+        if capacity < 1:
+            raise ValueError('Размер таблицы должен быть положительным')
+        if policy not in POLICIES:
+            raise ValueError(f'Неизвестная политика вытеснения: {policy}')
+
+        self.capacity = capacity
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        if policy == LRU:
+            self._entries = OrderedDict()
+        else:
+            self._entries = [None] * capacity
+
+    def __len__(self):
+        if self.policy == LRU:
+            return len(self._entries)
+        return sum(1 for entry in self._entries if entry is not None)
+
+    def __contains__(self, key):
+        if self.policy == LRU:
+            found = key in self._entries
+            if found:
+                self._entries.move_to_end(key)
+        else:
+            entry = self._entries[key % self.capacity]
+            found = entry is not None and entry[0] == key
+
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def add(self, key, depth):
+        """Запоминает, что состояние key на глубине depth
+        не имеет решения"""
+        self.stores += 1
+        if self.policy == LRU:
+            self._entries[key] = depth
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return
+
+        slot = key % self.capacity
+        entry = self._entries[slot]
+        if entry is None:
+            self._entries[slot] = (key, depth)
+        elif entry[0] == key or depth <= entry[1]:
+            if entry[0] != key:
+                self.evictions += 1
+            self._entries[slot] = (key, depth)
+
+    def clear(self):
+        if self.policy == LRU:
+            self._entries.clear()
+        else:
+            self._entries = [None] * self.capacity
+
+    def memory(self):
+        """Примерный объём памяти, занятый таблицей, в байтах"""
+        size = sys.getsizeof(self._entries)
+        if self.policy == LRU:
+            for key, depth in self._entries.items():
+                size += sys.getsizeof(key) + sys.getsizeof(depth)
+        else:
+            for entry in self._entries:
+                if entry is not None:
+                    size += (sys.getsizeof(entry) + sys.getsizeof(entry[0]) +
+                             sys.getsizeof(entry[1]))
+        return size
+
+    def stats(self):
+        """Счётчики таблицы"""
+        return {'hits': self.hits, 'misses': self.misses,
+                'stores': self.stores, 'evictions': self.evictions,
+                'entries': len(self), 'memory': self.memory()}
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+import argparse
+import sys
+
+from modules.engines import ENGINES, DEFAULT_ENGINE, create_solver
+from modules.files import save_task
+from modules.solver import UNKNOWN
+from modules.task import Task
+
+
+def parse_args():
+    """Разбор аргументов запуска"""
+    parser = argparse.ArgumentParser(description='Shikaku solver')
+    parser.add_argument('-P', '--puzzle', type=str,
+                        default='shikaku_puzzle.txt',
+                        help="load puzzle from file",
+                        metavar='PATH')
+    parser.add_argument('-S', '--solution', type=str,
+                        default='shikaku_solution.txt',
+                        help="save solution in file",
+                        metavar='PATH')
+    parser.add_argument('-E', '--engine', type=str,
+                        choices=sorted(ENGINES), default=DEFAULT_ENGINE,
+                        help='solver engine')
+    parser.add_argument('-T', '--timeout', type=float, default=None,
+                        help='give up after SECONDS',
+                        metavar='SECONDS')
+
+    return parser.parse_args()
+
+
+def solve_puzzle(puzzle_path, solution_path, engine=DEFAULT_ENGINE,
+                 timeout=None):
+    """Решает головоломку из файла и сохраняет решение.
+    Возвращает False, если решение не найдено, UNKNOWN, если не хватило
+    времени timeout, и бросает ValueError, если головоломка заведомо
+    не имеет решения"""
+    with open(puzzle_path, 'r', encoding='utf-8') as f:
+        task = Task.fromfile(f)
+
+    solver = create_solver(task, engine)
+    if not solver.report:
+        raise ValueError(str(solver.report))
+    result = solver.solve(timeout=timeout)
+    if not result:
+        return result
+
+    save_task(solution_path, task)
+    return True
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        result = solve_puzzle(args.puzzle, args.solution, args.engine,
+                              args.timeout)
+    except ValueError as e:
+        print(e.args[0] if e.args else 'Что-то пошло не так...',
+              file=sys.stderr)
+        sys.exit(1)
+    if result is UNKNOWN:
+        print('Решатель не успел решить головоломку', file=sys.stderr)
+        sys.exit(2)
+    if not result:
+        print('Решатель не смог найти решение головоломки', file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+
+import argparse
+import sys
+
+from modules.distributed import DistributedSolver, parse_address, run_worker
+from modules.files import save_task
+from modules.task import Task
+
+
+def parse_args():
+    """Разбор аргументов запуска"""
+    parser = argparse.ArgumentParser(description='Distributed Shikaku solver')
+    parser.add_argument('mode', choices=('coordinator', 'worker'),
+                        help='run coordinator or worker')
+    parser.add_argument('-A', '--address', type=str,
+                        default='127.0.0.1:20201',
+                        help='coordinator address: HOST:PORT or unix '
+                             'socket path',
+                        metavar='ADDRESS')
+    parser.add_argument('-P', '--puzzle', type=str,
+                        default='shikaku_puzzle.txt',
+                        help="load puzzle from file (coordinator)",
+                        metavar='PATH')
+    parser.add_argument('-S', '--solution', type=str,
+                        default='shikaku_solution.txt',
+                        help="save solution in file (coordinator)",
+                        metavar='PATH')
+    parser.add_argument('-W', '--workers', type=int, default=0,
+                        help='local workers started by coordinator')
+
+    return parser.parse_args()
+
+
+def coordinate(puzzle_path, solution_path, address, workers=0):
+    """Раздаёт перебор исполнителям и сохраняет решение.
+    Возвращает False, если решение не найдено"""
+    with open(puzzle_path, 'r', encoding='utf-8') as f:
+        task = Task.fromfile(f)
+
+    solver = DistributedSolver(task, address, workers)
+    if not solver.report:
+        raise ValueError(str(solver.report))
+    if not solver.solve():
+        return False
+
+    save_task(solution_path, task)
+    return True
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    address = parse_address(args.address)
+    if args.mode == 'worker':
+        run_worker(address)
+        sys.exit(0)
+
+    try:
+        result = coordinate(args.puzzle, args.solution, address, args.workers)
+    except ValueError as e:
+        print(e.args[0] if e.args else 'Что-то пошло не так...',
+              file=sys.stderr)
+        sys.exit(1)
+    if not result:
+        print('Решатель не смог найти решение головоломки', file=sys.stderr)
+        sys.exit(1)
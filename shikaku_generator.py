@@ -1,7 +1,10 @@
 #!/usr/bin/python3
 
 import argparse
-import os
+import json
+from multiprocessing import Pool
+
+from modules.files import make_folder, save_task
 from modules.generator import Generator
 
 
@@ -22,28 +25,88 @@ def parse_args():
                         default='shikaku_solution.txt',
                         help="save solution in file",
                         metavar='PATH')
+    parser.add_argument('-U', '--unique', action='store_true',
+                        help='generate puzzle with a unique solution')
+    parser.add_argument('--seed', type=str, default=None,
+                        help='random seed (batch item i uses SEED-i)')
+    parser.add_argument('--count', type=int, default=None,
+                        help='generate a batch of COUNT puzzles into '
+                             'a JSON Lines file')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='number of processes for batch generation')
+    parser.add_argument('-O', '--output', type=str,
+                        default='shikaku_puzzles.jsonl',
+                        help="save batch in file",
+                        metavar='PATH')
+    parser.add_argument('--stream', action='store_true',
+                        help='write the field layer by layer without '
+                             'keeping it in memory (for huge fields)')
+
+    args = parser.parse_args()
+    if args.stream and (args.unique or args.count is not None):
+        parser.error('--stream cannot be used with --unique or --count')
+    return args
+
+
+def generate_puzzle(width, height, depth, puzzle_path, solution_path,
+                    unique=False, seed=None):
+    generator = Generator(seed)
+    puzzle, solution = generator.generate(width, height, depth, unique)
+    save_task(puzzle_path, puzzle)
+    save_task(solution_path, solution)
+
+
+def stream_puzzle(width, height, depth, puzzle_path, solution_path,
+                  seed=None):
+    """Генерирует головоломку по слоям сразу в файлы,
+    не храня всё поле в памяти"""
+    make_folder(puzzle_path)
+    make_folder(solution_path)
+
+    with open(puzzle_path, 'w') as puzzle, \
+            open(solution_path, 'w') as solution:
+        Generator(seed).stream(width, height, depth, puzzle, solution)
 
-    return parser.parse_args()
 
+def item_seed(seed, index):
+    """Seed головоломки с номером index в пакете: по нему
+    головоломку можно сгенерировать заново через --seed"""
+    return f'{seed}-{index}'
 
-def _save_in_file(filename, task):
-    folder_path = os.path.dirname(filename)
 
-    if folder_path != '' and not os.path.exists(folder_path):
-        os.makedirs(folder_path)
+def _generate_item(item):
+    """Генерирует одну головоломку пакета и возвращает строку JSON"""
+    index, seed, sizes, unique = item
+    puzzle, solution = Generator(seed).generate(*sizes, unique)
+    return json.dumps({'index': index, 'seed': seed, 'size': sizes,
+                       'puzzle': str(puzzle), 'solution': str(solution)},
+                      ensure_ascii=False)
 
-    with open(filename, 'w') as f:
-        f.write(str(task))
 
+def generate_batch(width, height, depth, count, output_path, jobs=None,
+                   seed=0, unique=False):
+    """Генерирует count головоломок в jobs процессах и записывает их
+    в файл JSON Lines по мере готовности (порядок строк может
+    отличаться от порядка номеров)"""
+    make_folder(output_path)
 
-def generate_puzzle(width, height, depth, puzzle_path, solution_path):
-    generator = Generator()
-    puzzle, solution = generator.generate(width, height, depth)
-    _save_in_file(puzzle_path, puzzle)
-    _save_in_file(solution_path, solution)
+    items = ((index, item_seed(seed, index), (width, height, depth), unique)
+             for index in range(count))
+    with Pool(jobs) as pool, open(output_path, 'w', encoding='utf-8') as f:
+        for line in pool.imap_unordered(_generate_item, items,
+                                        chunksize=16):
+            f.write(line + '\n')
 
 
 if __name__ == '__main__':
     args = parse_args()
-    generate_puzzle(args.width, args.height, args.depth,
-                    args.puzzle, args.solution)
+    if args.stream:
+        stream_puzzle(args.width, args.height, args.depth,
+                      args.puzzle, args.solution, args.seed)
+    elif args.count is None:
+        generate_puzzle(args.width, args.height, args.depth,
+                        args.puzzle, args.solution, args.unique, args.seed)
+    else:
+        generate_batch(args.width, args.height, args.depth, args.count,
+                       args.output, args.jobs,
+                       0 if args.seed is None else args.seed, args.unique)
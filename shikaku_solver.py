@@ -4,7 +4,6 @@ import math
 import os
 import sys
 import threading
-from copy import deepcopy
 from contextlib import contextmanager
 
 from PyQt5 import QtCore
@@ -12,13 +11,15 @@ from PyQt5.QtCore import Qt, QPointF
 from PyQt5.QtGui import QPainter, QColor, QPen, QBrush, QPolygonF
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QFrame, QWidget,
                              QMessageBox, QHBoxLayout, QFileDialog, QAction,
-                             QVBoxLayout, QGridLayout, QSlider, QLineEdit,
-                             QPushButton, QLabel, QProgressBar)
+                             QActionGroup, QVBoxLayout, QGridLayout, QSlider,
+                             QLineEdit, QPushButton, QLabel, QProgressBar)
 
 import shikaku_generator
-from modules.solver import Solver
+from modules.engines import ENGINES, DEFAULT_ENGINE, create_solver
 from modules.task import Task
 
+PROGRESS_SCALE = 10000
+
 BACK_COLORS = {
     -1: QColor('white'),
     0: QColor('cyan'),
@@ -158,14 +159,32 @@ class GuiParallelepiped(QFrame):
                                      str(self._field[i[0]][i[1]][i[2]].mark))
 
 
-def thread(func):
-    """Запускает функцию в отдельном потоке"""
+class SolverThread(QtCore.QThread):
+    """Поток решателя. О ходе перебора и о результате сообщает сигналами,
+    которые обрабатываются в потоке интерфейса"""
+    progress_signal = QtCore.pyqtSignal(float, object)
+    result_signal = QtCore.pyqtSignal(object, object, object)
+
+    def __init__(self, task, engine, cancel, parent=None):
+        super().__init__(parent)
+        self._task = task
+        self._engine = engine
+        self._cancel = cancel
 
-    def wrapper(*args, **kwargs):
-        my_thread = threading.Thread(target=func, args=args, kwargs=kwargs)
-        my_thread.start()
+    def run(self):
+        solver = create_solver(self._task, self._engine)
+        report = solver.report
+        result = False
+        if report:
+            self._progress(solver)
+            result = solver.solve(cancel=self._cancel,
+                                  on_progress=self._progress)
+        if not self._cancel.is_set():
+            self.result_signal.emit(result, self._task, report)
 
-    return wrapper
+    def _progress(self, solver):
+        if not self._cancel.is_set():
+            self.progress_signal.emit(solver.progress(), solver.remaining())
 
 
 class input_dialog(QWidget):
@@ -251,14 +270,13 @@ class input_dialog(QWidget):
 
 
 class MainForm(QMainWindow):
-    solver_signal = QtCore.pyqtSignal(object, object)
 
     def __init__(self):
         super().__init__()
 
-        self.solver_signal.connect(self.signal_handler)
-
         self._task = None
+        self._engine = DEFAULT_ENGINE
+        self._cancel = None
         self._init_ui()
 
     def _init_ui(self):
@@ -272,7 +290,7 @@ class MainForm(QMainWindow):
 
         self.progress_bar = QProgressBar(self)
         self.mainLayout.addWidget(self.progress_bar)
-        self.progress_bar.setRange(0, 10000)
+        self.progress_bar.setRange(0, PROGRESS_SCALE)
 
         self.hBox = QHBoxLayout()
         self.mainLayout.addLayout(self.hBox)
@@ -314,6 +332,11 @@ class MainForm(QMainWindow):
         solve_action.setStatusTip('Решить головоломку')
         solve_action.triggered.connect(self.solver_handler)
 
+        stop_action = QAction('&Остановить', self)
+        stop_action.setShortcut('Ctrl+B')
+        stop_action.setStatusTip('Остановить решение головоломки')
+        stop_action.triggered.connect(self._stop_solver)
+
         self.statusBar()
 
         menubar = self.menuBar()
@@ -321,6 +344,17 @@ class MainForm(QMainWindow):
         file_menu.addAction(create_action)
         file_menu.addAction(open_file_action)
         file_menu.addAction(solve_action)
+        file_menu.addAction(stop_action)
+
+        engine_menu = menubar.addMenu('&Решатель')
+        engine_group = QActionGroup(self)
+        for name in sorted(ENGINES):
+            engine_action = QAction(name, self, checkable=True)
+            engine_action.setChecked(name == self._engine)
+            engine_action.triggered.connect(
+                lambda _, engine=name: self._engine_handler(engine))
+            engine_group.addAction(engine_action)
+            engine_menu.addAction(engine_action)
 
         self.msg = QMessageBox()
         self.msg.addButton('Ок', QMessageBox.RejectRole)
@@ -344,6 +378,15 @@ class MainForm(QMainWindow):
         if filename:
             self._get_task(filename)
 
+    def _stop_solver(self):
+        """Отменяет запущенное решение, его результат не показывается"""
+        if self._cancel is not None:
+            self._cancel.set()
+            self._cancel = None
+
+    def _engine_handler(self, engine):
+        self._engine = engine
+
     def _create_handler(self):
         self.new_window = input_dialog()
         self.new_window.show()
@@ -351,8 +394,7 @@ class MainForm(QMainWindow):
     def _get_task(self, filename):
         try:
             with open(filename, 'r', encoding='utf-8') as f:
-                data = f.read()
-                task = Task.fromstr(data)
+                task = Task.fromfile(f)
         except Exception as e:
             self.msg.setWindowTitle('Ошибка при открытии головоломки/решения:')
             if len(e.args) > 0:
@@ -361,6 +403,7 @@ class MainForm(QMainWindow):
                 self.msg.setText('Что-то пошло не так...')
             self.msg.show()
         else:
+            self._stop_solver()
             self._task = task
             self._update(task.field)
             self.progress_bar.setValue(0)
@@ -388,36 +431,41 @@ class MainForm(QMainWindow):
 
         self._activate_scrolls()
 
-    @thread
     def solver_handler(self, _):
-        task = deepcopy(self._task)
-        result = False
-        if task:
-            solver = Solver(task)
-            self.progress_bar.setRange(0, solver.max + 1)
-            self.progress_bar.setValue(solver.status)
-            flag = True
-
-            @thread
-            def check_status():
-                while flag:
-                    self.progress_bar.setValue(solver.status)
-
-            check_status()
-            result = solver.solve()
-            flag = False
-        self.solver_signal.emit(result, task)
-
-    def signal_handler(self, result, task):
+        self._stop_solver()
+        if not self._task:
+            self.signal_handler(False, None, None)
+            return
+
+        self._cancel = threading.Event()
+        solver_thread = SolverThread(Task(self._task.field), self._engine,
+                                     self._cancel, self)
+        solver_thread.progress_signal.connect(self._progress_handler)
+        solver_thread.result_signal.connect(self.signal_handler)
+        solver_thread.finished.connect(solver_thread.deleteLater)
+        solver_thread.start()
+
+    def _progress_handler(self, progress, remaining):
+        self.progress_bar.setValue(round(progress * PROGRESS_SCALE))
+        if remaining is not None:
+            self.statusBar().showMessage(
+                f'Осталось примерно {remaining:.0f} с')
+
+    def signal_handler(self, result, task, report):
+        self.statusBar().clearMessage()
         if not result:
             self.msg.setWindowTitle('Ошибка при решении головоломки')
             if task is None:
                 self.msg.setText('Головоломка не обнаружена')
+            elif report is not None and not report:
+                self.msg.setText(
+                    'Головоломка не имеет решения:\n\n' + str(report))
             else:
                 self.msg.setText(
                     'Решатель не смог найти решение головоломки')
             self.msg.show()
         else:
+            self.progress_bar.setValue(PROGRESS_SCALE)
             self._task = Task(field=task.solution,
                               solution=task.solution,
                               answer=task.answer)
@@ -458,36 +506,13 @@ class MainForm(QMainWindow):
 
     @staticmethod
     def _cut_task(field, dx=0, dy=0, dz=0):
-        def is_empty(arrays):
-            if len(arrays) < 1:
-                return True
-            for array in arrays:
-                if len(array) < 1:
-                    return True
-                for arr in array:
-                    if len(arr) < 1:
-                        return True
-            return False
-
-        field = deepcopy(field)
-        for x in range(len(field)):  # Глубина
-            for y in range(len(field[0])):
-                field[x][y] = field[x][y][dz:]
-
-        fields = [field[:dx], field[dx:]]
-
-        for i in range(len(fields)):
-            field = deepcopy(fields[i])
-            for x in range(len(field)):
-                field[x] = fields[i][x][:dy]
-
-            yield None if is_empty(field) else field
-
-            field = deepcopy(fields[i])
-            for x in range(len(field)):
-                field[x] = fields[i][x][dy:]
-
-            yield None if is_empty(field) else field
+        for low_x, high_x in ((0, dx), (dx, field.size_x)):
+            for low_y, high_y in ((0, dy), (dy, field.size_y)):
+                if low_x < high_x and low_y < high_y and dz < field.size_z:
+                    yield field.window((low_x, low_y, dz),
+                                       (high_x, high_y, field.size_z))
+                else:
+                    yield None
 
 
 if __name__ == '__main__':
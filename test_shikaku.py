@@ -2,10 +2,30 @@
 
 import unittest
 
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from copy import deepcopy
+
+import shikaku_console_solver
+import shikaku_generator
+from modules.analyzer import VOLUME_MISMATCH, NO_PLACEMENT, BAD_REGION
 from modules.cube import Cube
-from modules.generator import Generator
-from modules.solver import Solver
-from modules.task import Task
+from modules.distributed import DistributedSolver
+from modules.dlx import DancingLinksSolver
+from modules.generator import Generator, _Runs
+from modules.grid import Grid
+from modules.parallel import ParallelSolver, SUBTREES_PER_JOB
+from modules.portfolio import (PortfolioSolver, PortfolioStats, STRATEGIES,
+                               luby, solve_with_restarts)
+from modules.solver import (Solver, Budget, ProgressReporter,
+                            DYNAMIC_ORDERING, UNKNOWN, CHECK_STEPS,
+                            least_constraining_order)
+from modules.task import Task, Box
+from modules.transposition import TranspositionTable, DEPTH_PREFERRED
 
 
 class GeneratorTest(unittest.TestCase):
@@ -35,13 +55,13 @@ class GeneratorTest(unittest.TestCase):
         task, task_solution = self.generator.generate(2, 2, 2)
         count = 0
         for block in self.generator._answer:
-            count += len(block)
+            count += block.volume
         self.assertEqual(task.size_x * task.size_y * task.size_z, count, 8)
 
         task, task_solution = self.generator.generate(3, 5, 6)
         count = 0
         for block in self.generator._answer:
-            count += len(block)
+            count += block.volume
         self.assertEqual(task.size_x * task.size_y * task.size_z, count, 90)
 
     def test_generator_number_blocks_in_answer(self):
@@ -54,6 +74,76 @@ class GeneratorTest(unittest.TestCase):
                         count += 1
         self.assertEqual(count, len(self.generator._answer))
 
+    def test_unique(self):
+        task, task_solution = self.generator.generate(4, 4, 3, unique=True)
+        self.assertEqual(Solver(task).count_solutions(limit=None), 1)
+        for block in task_solution.answer:
+            marks = [task.field[x][y][z].mark for x, y, z in block.cells()
+                     if task.field[x][y][z].is_marked()]
+            self.assertEqual(marks, [block.volume])
+
+        solution = next(Solver(task).solutions())
+        self.assertEqual(sorted(block.bounds for block in solution.answer),
+                         sorted(block.bounds
+                                for block in task_solution.answer))
+
+    def test_choose_sides(self):
+        self.generator._runs = _Runs(2, 2, 2)
+        sides = {self.generator._choose_sides(0, 0, 0) for _ in range(300)}
+        self.assertEqual(sides, {(sx, sy, sz) for sx in (1, 2)
+                                 for sy in (1, 2) for sz in (1, 2)})
+
+        self.generator._occupy_runs(1, 1, 1, 1, 1, 1)
+        self.assertEqual(self.generator._runs[1][1], [1, 0])
+        sides = {self.generator._choose_sides(0, 0, 0) for _ in range(300)}
+        self.assertNotIn((2, 2, 2), sides)
+        self.assertEqual(len(sides), 7)
+
+    def test_stream(self):
+        puzzle, solution = io.StringIO(), io.StringIO()
+        Generator(5).stream(6, 4, 5, puzzle, solution)
+        task = Task.fromstr(puzzle.getvalue())
+        solved = Task.fromstr(solution.getvalue())
+        self.assertEqual((task.size_x, task.size_y, task.size_z), (6, 4, 5))
+
+        blocks = {}
+        marks = {}
+        for x in range(6):
+            for y in range(4):
+                for z in range(5):
+                    cube = solved.field[x][y][z]
+                    self.assertEqual(task.field[x][y][z].mark, cube.mark)
+                    blocks.setdefault(cube.color, []).append((x, y, z))
+                    if cube.is_marked():
+                        marks.setdefault(cube.color, []).append(cube.mark)
+        for color, cells in blocks.items():
+            self.assertEqual(marks[color], [len(cells)])
+            lows = [min(cell[axis] for cell in cells) for axis in range(3)]
+            highs = [max(cell[axis] for cell in cells) for axis in range(3)]
+            volume = 1
+            for low, high in zip(lows, highs):
+                volume *= high - low + 1
+            self.assertEqual(volume, len(cells))
+        self.assertTrue(Solver(task).solve())
+
+    def test_split_block(self):
+        self.generator.generate(2, 2, 2)
+        block = Box(0, 0, 0, 1, 1, 1, 0)
+        self.generator._answer = [block]
+        for x, y, z in block.cells():
+            self.generator._solution[x][y][z].color = 0
+
+        self.assertEqual(self.generator._split_block(0), 1)
+        for half in self.generator._answer:
+            self.assertEqual(half.volume, 4)
+            marks = [self.generator._field[x][y][z].mark
+                     for x, y, z in half.cells()
+                     if self.generator._field[x][y][z].is_marked()]
+            self.assertEqual(marks, [4])
+            for x, y, z in half.cells():
+                self.assertEqual(self.generator._solution[x][y][z].color,
+                                 half.color)
+
     def test_bed_sides(self):
         with self.assertRaises(ValueError):
             self.generator.generate(-1, 2, 2)
@@ -114,6 +204,13 @@ class TaskTest(unittest.TestCase):
         self.assertEqual(task1, Task.fromstr(str(task1)))
         self.assertEqual(task2, Task.fromstr(str(task2)))
 
+    def test_box(self):
+        box = Box(1, 0, 2, 2, 0, 3, 5)
+        self.assertEqual(box.volume, 4)
+        self.assertEqual(box.bounds, (1, 0, 2, 2, 0, 3))
+        self.assertEqual(list(box.cells()),
+                         [(1, 0, 2), (1, 0, 3), (2, 0, 2), (2, 0, 3)])
+
     def test_load_bad(self):
         with self.assertRaises(ValueError):
             Task.fromstr('asd')
@@ -124,6 +221,34 @@ class TaskTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             Task.fromstr('- 2*\n- -1')
 
+        for text in ('', '-\n', '1_2 -', '- 1_*'):
+            with self.assertRaises(ValueError):
+                Task.fromstr(text)
+
+    def test_error_position(self):
+        with self.assertRaises(ValueError) as context:
+            Task.fromstr('-\t2*\n-\t-1')
+        self.assertEqual(context.exception.args[0],
+                         'строка:символ\n\n2:4\n-\t-1:1')
+
+        with self.assertRaises(ValueError) as context:
+            Task.fromstr('1_2*\t-\n3\t4*x')
+        self.assertEqual(context.exception.args[0],
+                         'строка:символ\n\n2:5\n3\t4*x:x')
+
+        with self.assertRaises(ValueError) as context:
+            Task.fromstr('-\t99999999999*')
+        self.assertEqual(context.exception.args[0],
+                         'строка:символ\n\n1:3\n-\t99999999999*:9')
+
+    def test_load_from_file(self):
+        text = '1_2*\t0\n3\t4*\n\n-\t5\n6_7*\t-'
+        task = Task.fromfile(io.StringIO(text))
+        self.assertEqual((task.size_x, task.size_y, task.size_z), (2, 2, 2))
+        self.assertEqual(str(task), text)
+        self.assertEqual(task.field[1][1][0].color, 6)
+        self.assertEqual(task.field[1][1][0].mark, 7)
+
     def test_init_bad(self):
         with self.assertRaises(ValueError):
             Task([])
@@ -135,13 +260,74 @@ class TaskTest(unittest.TestCase):
             Task([[[]]])
 
 
+class GridTest(unittest.TestCase):
+    def setUp(self):
+        self.field = [[[Cube(), Cube(mark=4)],
+                       [Cube(color=1), Cube(color=0, mark=2)]],
+
+                      [[Cube(mark=8), Cube()],
+                       [Cube(), Cube(color=3)]]]
+        self.grid = Grid.fromcubes(self.field)
+
+    def test_views(self):
+        self.assertEqual(len(self.grid), 2)
+        self.assertEqual(len(self.grid[0]), 2)
+        self.assertEqual(len(self.grid[0][0]), 2)
+        for x in range(2):
+            for y in range(2):
+                for z in range(2):
+                    self.assertEqual(self.grid[x][y][z], self.field[x][y][z])
+                    self.assertEqual(str(self.grid[x][y][z]),
+                                     str(self.field[x][y][z]))
+        self.assertEqual([[list(map(str, row)) for row in layer]
+                          for layer in self.grid],
+                         [[list(map(str, row)) for row in layer]
+                          for layer in self.field])
+
+        self.grid[1][0][1].color = 5
+        self.assertEqual(self.grid.colors[self.grid.index(1, 0, 1)], 5)
+        self.grid[0][1][1].mark = None
+        self.assertFalse(self.grid[0][1][1].is_marked())
+        with self.assertRaises(IndexError):
+            self.grid[0][2]
+
+    def test_copy(self):
+        copy = deepcopy(self.grid)
+        self.assertEqual(copy, self.grid)
+        self.assertIs(copy.colors, self.grid.colors)
+
+        copy[0][0][0].color = 7
+        self.assertNotEqual(copy, self.grid)
+        self.assertIsNone(self.grid[0][0][0].color)
+        self.assertIs(copy.marks, self.grid.marks)
+
+        self.grid[0][0][1].mark = 3
+        self.assertEqual(copy[0][0][1].mark, 4)
+
+    def test_str_and_window(self):
+        self.assertEqual(str(self.grid),
+                         '-\t4*\n1\t0_2*\n\n8*\t-\n-\t3')
+        window = self.grid.window((0, 1, 1), (2, 2, 2))
+        self.assertEqual((len(window), len(window[0]), len(window[0][0])),
+                         (2, 1, 1))
+        self.assertEqual([[list(map(str, row)) for row in layer]
+                          for layer in window], [[['0_2*']], [['3']]])
+        self.grid[1][1][1].color = 4
+        self.assertEqual(window[1][0][0].color, 4)
+        with self.assertRaises(ValueError):
+            self.grid.window((0, 0, 0), (3, 1, 1))
+
+
 class SolverTest(unittest.TestCase):
+    solver_class = Solver
+    solve_options = {}
+
     def test_1(self):
         # (1, 2, 2)
         task = Task([[[Cube(), Cube()],
                       [Cube(), Cube(mark=4)]]])
-        solver = Solver(task)
-        result = solver.solve()
+        solver = self.solver_class(task)
+        result = solver.solve(**self.solve_options)
         self.assertTrue(result)
         self._check_marks(task)
 
@@ -155,8 +341,8 @@ class SolverTest(unittest.TestCase):
         task = Task([[[Cube()], [Cube()]],
 
                      [[Cube(4)], [Cube()]]])
-        solver = Solver(task)
-        result = solver.solve()
+        solver = self.solver_class(task)
+        result = solver.solve(**self.solve_options)
         self.assertTrue(result)
         self._check_marks(task)
 
@@ -172,8 +358,8 @@ class SolverTest(unittest.TestCase):
 
                      [[Cube(), Cube(mark=4)],
                       [Cube(), Cube()]]])
-        solver = Solver(task)
-        result = solver.solve()
+        solver = self.solver_class(task)
+        result = solver.solve(**self.solve_options)
         self.assertTrue(result)
         self._check_marks(task)
         self.assertNotEqual(task.solution[0][0][1].color,
@@ -196,8 +382,8 @@ class SolverTest(unittest.TestCase):
 
                      [[Cube(), Cube()],
                       [Cube(), Cube(mark=8)]]])
-        solver = Solver(task)
-        result = solver.solve()
+        solver = self.solver_class(task)
+        result = solver.solve(**self.solve_options)
         self.assertTrue(result)
         self._check_marks(task)
 
@@ -216,8 +402,8 @@ class SolverTest(unittest.TestCase):
 
                      [[Cube(), Cube()],
                       [Cube(), Cube()]]])
-        solver = Solver(task)
-        result = solver.solve()
+        solver = self.solver_class(task)
+        result = solver.solve(**self.solve_options)
         self.assertTrue(result)
         self._check_marks(task)
 
@@ -242,8 +428,8 @@ class SolverTest(unittest.TestCase):
                      [[Cube(), Cube(), Cube()],
                       [Cube(), Cube(), Cube()]]])
 
-        solver = Solver(task)
-        result = solver.solve()
+        solver = self.solver_class(task)
+        result = solver.solve(**self.solve_options)
         self.assertTrue(result)
         self._check_marks(task)
 
@@ -268,8 +454,8 @@ class SolverTest(unittest.TestCase):
                       [Cube(mark=4), Cube(), Cube(color=6)],
                       [Cube(), Cube(), Cube(color=6)]]])
 
-        solver = Solver(task)
-        result = solver.solve()
+        solver = self.solver_class(task)
+        result = solver.solve(**self.solve_options)
         self.assertTrue(result)
         self._check_marks(task)
 
@@ -286,12 +472,43 @@ class SolverTest(unittest.TestCase):
                                 range(task.size_y),
                                 range(2, task.size_z))
 
+    def test_placements(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=2)],
+                      [Cube(), Cube(), Cube(mark=2)]]])
+        solver = self.solver_class(task)
+        for block in solver._blocks:
+            self.assertTrue(block.placements)
+            for parallelepiped in block.placements:
+                self.assertFalse(parallelepiped.is_conflict())
+                self.assertEqual(bin(parallelepiped.mask).count('1'),
+                                 block.value)
+                for x, y, z in parallelepiped.cells():
+                    self.assertTrue(
+                        parallelepiped.mask >> task.index(x, y, z) & 1)
+                self.assertTrue(
+                    0 <= parallelepiped.point1.z <= block.z <=
+                    parallelepiped.point2.z < task.size_z)
+
+        self.assertEqual(
+            sorted(len(b.placements) for b in solver._blocks), [1, 1, 2])
+
     def _check_color_range(self, task, value, range_x, range_y, range_z):
         for x in range_x:
             for y in range_y:
                 for z in range_z:
                     self.assertEqual(value, task.solution[x][y][z].color)
 
+    def test_unfinished_region(self):
+        task = Task.fromstr('0_4*\t0\t-\t-\n-\t-\t4*\t-')
+        solver = self.solver_class(task)
+        for _ in range(2):
+            self.assertTrue(solver.solve(**self.solve_options))
+            self._check_marks(task)
+            self.assertEqual(task.solution[0][0][1].color, 0)
+            self.assertNotIn(-1, task.solution.colors)
+            self.assertEqual(sorted(box.volume for box in task.answer),
+                             [4, 4])
+
     def _check_marks(self, task):
         for x in range(task.size_x):
             for y in range(task.size_y):
@@ -300,5 +517,627 @@ class SolverTest(unittest.TestCase):
                                      task.solution[x][y][z].mark)
 
 
+class DynamicOrderingSolverTest(SolverTest):
+    solve_options = {'ordering': DYNAMIC_ORDERING}
+
+    def test_generated(self):
+        task, _ = Generator().generate(5, 4, 3)
+        self.assertTrue(Solver(task).solve(**self.solve_options))
+        self._check_marks(task)
+        self.assertEqual(
+            sum(block.volume for block in task.answer),
+            task.size_x * task.size_y * task.size_z)
+
+    def test_against_static(self):
+        for seed in range(5):
+            task, _ = Generator(seed).generate(6, 6, 6)
+            static = Solver(deepcopy(task))
+            dynamic = Solver(task)
+            self.assertTrue(static.solve())
+            self.assertTrue(dynamic.solve(**self.solve_options))
+            self.assertLessEqual(dynamic.nodes, static.nodes)
+            self._check_marks(task)
+            self.assertEqual(
+                sum(block.volume for block in task.answer),
+                task.size_x * task.size_y * task.size_z)
+
+    def test_bad_ordering(self):
+        task = Task([[[Cube(), Cube(mark=2)]]])
+        with self.assertRaises(ValueError):
+            Solver(task).solve(ordering='random')
+
+
+class LeastConstrainingSolverTest(SolverTest):
+    solve_options = {'ordering': DYNAMIC_ORDERING,
+                     'placement_order': 'least_constraining'}
+
+
+class ConstrainedCellsSolverTest(SolverTest):
+    solve_options = {'placement_order': 'constrained_cells'}
+
+
+class PropagatingSolverTest(SolverTest):
+    solve_options = {'propagate': True}
+
+    def test_dead_cell(self):
+        task = Task([[[Cube(), Cube(mark=1), Cube(mark=2), Cube(),
+                       Cube(mark=2)]]])
+        solver = Solver(task)
+        self.assertFalse(solver.solve(**self.solve_options))
+        self.assertEqual(solver.nodes, 0)
+        self.assertEqual(task.answer, [])
+
+    def test_forced_cells(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=3), Cube(), Cube()]]])
+        solver = Solver(task)
+        self.assertTrue(solver.solve(**self.solve_options))
+        self.assertEqual(solver.nodes, 0)
+        self.assertEqual(len(task.answer), 2)
+
+    def test_generated(self):
+        task, _ = Generator().generate(6, 5, 4)
+        self.assertTrue(Solver(task).solve(**self.solve_options))
+        self._check_marks(task)
+        self.assertEqual(
+            sum(block.volume for block in task.answer),
+            task.size_x * task.size_y * task.size_z)
+
+
+class DynamicPropagatingSolverTest(PropagatingSolverTest):
+    solve_options = {'ordering': DYNAMIC_ORDERING, 'propagate': True}
+
+
+class ComponentsSolverTest(SolverTest):
+    solve_options = {'components': True}
+
+    def test_split(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=1, color=0),
+                       Cube(mark=2), Cube()]]])
+        solver = Solver(task)
+        components = solver._split(None)
+        self.assertEqual([[(b.x, b.y, b.z) for b in blocks]
+                          for blocks in components],
+                         [[(0, 0, 0)], [(0, 0, 3)]])
+        self.assertTrue(solver.solve(**self.solve_options))
+
+        task = Task([[[Cube(mark=3), Cube(), Cube(mark=1, color=0),
+                       Cube(), Cube(mark=1)]]])
+        self.assertIsNone(Solver(task)._split(None))
+
+    def test_generated(self):
+        task, _ = Generator().generate(6, 5, 4)
+        self.assertTrue(Solver(task).solve(**self.solve_options))
+        self._check_marks(task)
+        self.assertEqual(
+            sum(block.volume for block in task.answer),
+            task.size_x * task.size_y * task.size_z)
+
+
+class DynamicPropagatingComponentsSolverTest(ComponentsSolverTest):
+    solve_options = {'ordering': DYNAMIC_ORDERING, 'propagate': True,
+                     'components': True}
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def test_lru(self):
+        table = TranspositionTable(2)
+        table.add(1, 0)
+        table.add(2, 0)
+        self.assertIn(1, table)
+        table.add(3, 0)
+        self.assertNotIn(2, table)
+        self.assertIn(1, table)
+        self.assertEqual(len(table), 2)
+        self.assertEqual((table.hits, table.misses, table.evictions),
+                         (2, 1, 1))
+        self.assertGreater(table.memory(), 0)
+
+    def test_depth_preferred(self):
+        table = TranspositionTable(4, DEPTH_PREFERRED)
+        table.add(1, 3)
+        table.add(5, 5)
+        self.assertIn(1, table)
+        table.add(5, 2)
+        self.assertIn(5, table)
+        self.assertNotIn(1, table)
+        self.assertEqual(table.evictions, 1)
+
+    def test_bad(self):
+        with self.assertRaises(ValueError):
+            TranspositionTable(0)
+        with self.assertRaises(ValueError):
+            TranspositionTable(10, 'fifo')
+
+    def test_solver(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=4), Cube()],
+                      [Cube(), Cube(mark=2), Cube(), Cube()],
+                      [Cube(), Cube(), Cube(mark=2), Cube(mark=2)]]])
+        solver = Solver(task)
+        self.assertFalse(solver.solve())
+        nodes = solver.nodes
+
+        memo = TranspositionTable()
+        solver = Solver(task)
+        self.assertFalse(solver.solve(memo=memo))
+        self.assertIs(solver.memo, memo)
+        self.assertGreater(memo.hits, 0)
+        self.assertLess(solver.nodes, nodes)
+
+        task, _ = Generator().generate(5, 4, 3)
+        self.assertTrue(Solver(task).solve(
+            ordering=DYNAMIC_ORDERING, propagate=True, components=True,
+            memo=TranspositionTable(1000, DEPTH_PREFERRED)))
+
+
+class IterativeSearchTest(unittest.TestCase):
+    def test_many_blocks(self):
+        size = sys.getrecursionlimit() + 500
+        task = Task([[[Cube(mark=1) for _ in range(size)]]])
+        self.assertTrue(Solver(task).solve())
+        self.assertEqual(len(task.answer), size)
+
+    def test_pause_and_resume(self):
+        task, _ = Generator().generate(4, 4, 3)
+        expected = deepcopy(task)
+        self.assertTrue(Solver(expected).solve())
+
+        solver = Solver(task)
+        solver.start()
+        steps = 0
+        result = solver.resume(1)
+        while result is None:
+            steps += 1
+            self.assertEqual(task.answer, [])
+            result = solver.resume(1)
+        self.assertTrue(result)
+        self.assertGreater(steps, 0)
+        self.assertTrue(solver.resume())
+        self.assertEqual(task.answer, expected.answer)
+
+
+class BudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.task = Task([[[Cube(mark=2), Cube()],
+                           [Cube(), Cube(mark=2)]]])
+
+    def test_nodes(self):
+        solver = Solver(self.task)
+        memo = TranspositionTable()
+        result = solver.solve(memo=memo, nodes=1)
+        self.assertIs(result, UNKNOWN)
+        self.assertIsNot(result, False)
+        self.assertEqual(len(solver.partial), 1)
+        self.assertEqual(self.task.answer, [])
+        self.assertEqual(memo.stores, 0)
+        self.assertTrue(solver.solve(nodes=100))
+
+    def test_timeout_and_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        for options in ({'timeout': 0}, {'cancel': cancel}):
+            self.assertIs(Solver(self.task).solve(**options), UNKNOWN)
+            for solver_class in (PortfolioSolver, ParallelSolver,
+                                 DistributedSolver):
+                self.assertIs(solver_class(self.task).solve(**options),
+                              UNKNOWN)
+
+    def test_partial(self):
+        solver = Solver(self.task)
+        solver.solve(nodes=1)
+        solver.apply_placements(solver.partial)
+        self.assertEqual(len(self.task.answer), 1)
+
+    def test_dancing_links(self):
+        solver = DancingLinksSolver(self.task)
+        self.assertIs(solver.solve(nodes=1), UNKNOWN)
+        self.assertEqual(len(solver.partial), 1)
+        self.assertTrue(solver.solve())
+        self.assertTrue(solver.solve(timeout=60))
+
+
+class SolutionsTest(unittest.TestCase):
+    def test_two_solutions(self):
+        task = Task([[[Cube(mark=2), Cube()],
+                      [Cube(), Cube(mark=2)]]])
+        solver = Solver(task)
+        expected = str(task)
+        solutions = list(solver.solutions())
+        self.assertEqual(len(solutions), 2)
+        self.assertNotEqual(solutions[0].answer, solutions[1].answer)
+        for solution in solutions:
+            self.assertEqual(len(solution.answer), 2)
+            self.assertEqual(solution.field, task.field)
+        self.assertEqual(task.answer, [])
+        self.assertEqual(str(task), expected)
+
+        self.assertEqual(solver.count_solutions(), 2)
+        self.assertEqual(solver.count_solutions(limit=1), 1)
+        self.assertEqual(solver.count_solutions(limit=None,
+                                                propagate=False), 2)
+        self.assertTrue(solver.solve())
+
+    def test_lazy(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(), Cube(mark=2)]
+                      for _ in range(2)]])
+        solutions = Solver(task).solutions()
+        self.assertEqual(len(next(solutions).answer), 4)
+
+    def test_generated(self):
+        task, _ = Generator().generate(4, 3, 3)
+        for options in ({}, {'propagate': True},
+                        {'ordering': DYNAMIC_ORDERING, 'propagate': True}):
+            solutions = list(Solver(deepcopy(task)).solutions(**options))
+            self.assertGreaterEqual(len(solutions), 1)
+            for solution in solutions:
+                self.assertEqual(
+                    sum(block.volume for block in solution.answer),
+                    task.size_x * task.size_y * task.size_z)
+        self.assertEqual(Solver(task).count_solutions(limit=None),
+                         len(solutions))
+
+    def test_unsolvable(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube()]]])
+        self.assertEqual(Solver(task).count_solutions(), 0)
+
+
+class ProgressReporterTest(unittest.TestCase):
+    def test_steps(self):
+        task = Task([[[Cube(mark=2), Cube()],
+                      [Cube(), Cube(mark=2)]]])
+        for solver_class in (Solver, DancingLinksSolver):
+            calls = []
+            solver = solver_class(deepcopy(task))
+            self.assertTrue(solver.solve(on_progress=calls.append,
+                                         progress_steps=1,
+                                         progress_interval=None))
+            self.assertTrue(calls)
+            self.assertTrue(all(call is solver for call in calls))
+
+    def test_interval(self):
+        calls = []
+        reporter = ProgressReporter(calls.append, interval=None)
+        reporter.advance(None, 5000)
+        self.assertEqual(calls, [])
+
+        reporter = ProgressReporter(calls.append, interval=0)
+        self.assertEqual(reporter.steps(), CHECK_STEPS)
+        reporter.advance(None, 1)
+        self.assertEqual(calls, [None])
+
+
+class ProgressEstimateTest(unittest.TestCase):
+    def test_progress(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=4), Cube()],
+                      [Cube(), Cube(mark=2), Cube(), Cube()],
+                      [Cube(), Cube(), Cube(mark=2), Cube(mark=2)]]])
+        solver = Solver(task)
+        self.assertEqual(solver.progress(), 0)
+        self.assertIsNone(solver.remaining())
+
+        solver.start()
+        values = [solver.progress()]
+        while solver.resume(1) is None:
+            values.append(solver.progress())
+            self.assertGreaterEqual(values[-1], values[-2])
+            self.assertLessEqual(values[-1], 1)
+        self.assertGreater(values[-1], 0)
+        self.assertEqual(solver.progress(), 1)
+        self.assertEqual(solver.remaining(), 0)
+
+    def test_remaining(self):
+        task, _ = Generator().generate(5, 4, 3)
+        for solver in (Solver(deepcopy(task)),
+                       DancingLinksSolver(deepcopy(task))):
+            estimates = []
+            self.assertTrue(solver.solve(
+                on_progress=lambda s: estimates.append(
+                    (s.progress(), s.remaining())),
+                progress_steps=1, progress_interval=None))
+            for progress, remaining in estimates:
+                self.assertTrue(0 <= progress <= 1)
+                self.assertTrue(remaining is None or remaining >= 0)
+
+
+class ParallelSolverTest(SolverTest):
+    solver_class = ParallelSolver
+
+    def test_split(self):
+        task, _ = Generator().generate(4, 3, 3)
+        solver = Solver(task)
+        prefixes = solver.split(2)
+        self.assertTrue(prefixes)
+        self.assertTrue(all(len(prefix) <= 2 for prefix in prefixes))
+
+        results = []
+        for prefix in prefixes:
+            solver.start(prefix=prefix)
+            results.append(solver.resume())
+        self.assertTrue(any(results))
+
+    def test_subtrees(self):
+        task, _ = Generator(4).generate(5, 4, 3)
+        solver = ParallelSolver(task, jobs=2)
+        self.assertLess(len(solver.split(2)), 2 * SUBTREES_PER_JOB)
+        prefixes = solver._split(Budget(), {})
+        self.assertGreaterEqual(len(prefixes), 2 * SUBTREES_PER_JOB)
+        self.assertTrue(solver.solve())
+        self._check_marks(task)
+
+    def test_generated(self):
+        task, _ = Generator().generate(5, 4, 3)
+        solver = ParallelSolver(task, jobs=2)
+        self.assertTrue(solver.solve(propagate=True))
+        self._check_marks(task)
+        self.assertEqual(
+            sum(block.volume for block in task.answer),
+            task.size_x * task.size_y * task.size_z)
+
+    def test_unsolvable(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=4), Cube()],
+                      [Cube(), Cube(mark=2), Cube(), Cube()],
+                      [Cube(), Cube(), Cube(mark=2), Cube(mark=2)]]])
+        self.assertFalse(ParallelSolver(task, jobs=2).solve())
+
+
+class PortfolioSolverTest(SolverTest):
+    solver_class = PortfolioSolver
+
+    def test_stats(self):
+        stats = PortfolioStats()
+        for _ in range(2):
+            task, _ = Generator().generate(4, 3, 3)
+            solver = PortfolioSolver(task, stats=stats)
+            self.assertTrue(solver.solve())
+            self.assertIn(solver.winner, [s.name for s in STRATEGIES])
+            self.assertGreaterEqual(solver.elapsed, 0)
+            self._check_marks(task)
+
+        self.assertEqual(sum(stats.wins.values()), 2)
+        self.assertEqual(set(stats.runs.values()), {2})
+        self.assertTrue(str(stats))
+
+    def test_unsolvable(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=4), Cube()],
+                      [Cube(), Cube(mark=2), Cube(), Cube()],
+                      [Cube(), Cube(), Cube(mark=2), Cube(mark=2)]]])
+        self.assertFalse(PortfolioSolver(task).solve())
+
+    def test_progress(self):
+        task, _ = Generator().generate(4, 3, 3)
+        solver = PortfolioSolver(task)
+        self.assertEqual(solver.progress(), 0.0)
+        self.assertTrue(solver.solve())
+        self.assertEqual(solver.progress(), 1.0)
+        self.assertTrue(solver.resume())
+
+        task = Task([[[Cube(mark=5), Cube(), Cube()]]])
+        solver = PortfolioSolver(task)
+        self.assertFalse(solver.solve())
+        self.assertFalse(solver.resume())
+        self.assertEqual(solver.progress(), 1.0)
+
+    def test_restarts(self):
+        self.assertEqual([luby(i) for i in range(1, 9)],
+                         [1, 1, 2, 1, 1, 2, 4, 1])
+        task, _ = Generator().generate(5, 4, 3)
+        self.assertTrue(solve_with_restarts(Solver(task), steps=1,
+                                            propagate=True))
+        self._check_marks(task)
+
+
+class DistributedSolverTest(SolverTest):
+    solver_class = DistributedSolver
+
+    def test_donate(self):
+        task, _ = Generator().generate(5, 4, 3)
+        solver = Solver(task)
+        solver.start()
+        solver.resume(3)
+        prefixes = solver.donate()
+        results = [solver.resume()]
+        for prefix in prefixes:
+            solver.start(prefix=prefix)
+            results.append(solver.resume())
+        self.assertTrue(any(results))
+
+    def test_donate_propagate(self):
+        options = {'ordering': DYNAMIC_ORDERING, 'propagate': True}
+        for seed in range(40):
+            task, _ = Generator(seed).generate(5, 5, 4)
+            solver = Solver(task)
+            solver.start(**options)
+            solver.resume(2)
+            prefixes = solver.donate()
+            results = [solver.resume()]
+            for prefix in prefixes:
+                solver.start(prefix=prefix, **options)
+                results.append(solver.resume())
+            self.assertTrue(any(results))
+
+    def test_generated(self):
+        task, _ = Generator().generate(5, 4, 3)
+        solver = DistributedSolver(task, workers=2, levels=1)
+        self.assertTrue(solver.solve(propagate=True))
+        self._check_marks(task)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'нужен Unix-сокет')
+    def test_unix_socket(self):
+        task, _ = Generator().generate(4, 3, 3)
+        with tempfile.TemporaryDirectory() as folder:
+            solver = DistributedSolver(task, os.path.join(folder, 'socket'),
+                                       workers=1)
+            self.assertTrue(solver.solve())
+        self._check_marks(task)
+
+    def test_lost_worker(self):
+        task, _ = Generator().generate(4, 3, 3)
+        solver = DistributedSolver(task)
+        solver._queue.extend([[1], [2]])
+        worker = solver.register()
+        self.assertEqual(solver.dispatch(worker, {'type': 'get'}),
+                         {'type': 'work', 'prefix': [1]})
+        solver.lost(worker)
+        self.assertEqual(list(solver._queue), [[1], [2]])
+
+    def test_steal(self):
+        task, _ = Generator().generate(4, 3, 3)
+        solver = DistributedSolver(task)
+        solver._queue.append([1])
+        busy, idle = solver.register(), solver.register()
+        solver.dispatch(busy, {'type': 'get'})
+        self.assertEqual(solver.dispatch(idle, {'type': 'get'}),
+                         {'type': 'wait'})
+        self.assertEqual(solver.dispatch(busy, {'type': 'progress'}),
+                         {'type': 'donate'})
+        solver.dispatch(busy, {'type': 'donation', 'prefixes': [[1, 5]]})
+        self.assertEqual(solver.dispatch(idle, {'type': 'get'}),
+                         {'type': 'work', 'prefix': [1, 5]})
+        solver.dispatch(idle, {'type': 'result', 'numbers': None})
+        self.assertFalse(solver._done.is_set())
+        solver.dispatch(busy, {'type': 'result', 'numbers': None})
+        self.assertTrue(solver._done.is_set())
+
+
+class PlacementOrderTest(unittest.TestCase):
+    def test_custom_order(self):
+        task = Task([[[Cube(mark=2), Cube()],
+                      [Cube(), Cube(mark=2)]]])
+        solver = Solver(task)
+        self.assertTrue(solver.solve(
+            placement_order=lambda s, d, placements: placements[::-1]))
+        self.assertEqual(list(task.answer[0].cells()),
+                         [(0, 0, 0), (0, 1, 0)])
+        self.assertEqual(task.solution[0][0][0].color,
+                         task.solution[0][1][0].color)
+
+        self.assertTrue(solver.solve())
+        self.assertEqual(list(task.answer[0].cells()),
+                         [(0, 0, 0), (0, 0, 1)])
+        self.assertEqual(task.solution[0][0][0].color,
+                         task.solution[0][0][1].color)
+
+    def test_least_constraining(self):
+        task = Task([[[Cube(), Cube(mark=2), Cube(), Cube(mark=2)]]])
+        solver = Solver(task)
+        order = least_constraining_order(
+            solver, 0, solver._blocks[0].placements)
+        self.assertEqual([p.point1.z for p in order], [0, 1])
+
+    def test_bad_order(self):
+        task = Task([[[Cube(), Cube(mark=2)]]])
+        with self.assertRaises(ValueError):
+            Solver(task).solve(placement_order='unknown')
+
+
+class DancingLinksSolverTest(SolverTest):
+    solver_class = DancingLinksSolver
+
+    def test_generated(self):
+        task, _ = Generator().generate(4, 3, 3)
+        self.assertTrue(DancingLinksSolver(task).solve())
+        self._check_marks(task)
+        for x in range(task.size_x):
+            for y in range(task.size_y):
+                for z in range(task.size_z):
+                    self.assertTrue(task.solution[x][y][z].is_colored())
+        self.assertEqual(
+            sum(block.volume for block in task.answer),
+            task.size_x * task.size_y * task.size_z)
+
+    def test_unsolvable(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=2)],
+                      [Cube(), Cube(mark=1), Cube()]]])
+        self.assertFalse(DancingLinksSolver(task).solve())
+
+
+class AnalyzerTest(unittest.TestCase):
+    def _kinds(self, task):
+        return [problem.kind for problem in Solver(task).report.problems]
+
+    def test_feasible(self):
+        task = Task([[[Cube(), Cube(mark=2), Cube(mark=3, color=6)],
+                      [Cube(mark=4), Cube(), Cube(color=6)],
+                      [Cube(), Cube(), Cube(color=6)]]])
+        self.assertTrue(Solver(task).report)
+
+    def test_volume(self):
+        task = Task([[[Cube(mark=2), Cube(), Cube()]]])
+        solver = Solver(task)
+        self.assertEqual(self._kinds(task), [VOLUME_MISMATCH])
+        self.assertFalse(solver.solve())
+        self.assertEqual(solver.nodes, 0)
+
+    def test_placement(self):
+        task = Task([[[Cube(mark=3), Cube()],
+                      [Cube(), Cube(mark=1)]]])
+        self.assertEqual(self._kinds(task), [NO_PLACEMENT])
+
+    def test_regions(self):
+        task = Task([[[Cube(mark=3, color=0), Cube(mark=1), Cube(color=0)],
+                      [Cube(mark=2), Cube(), Cube()]]])
+        self.assertEqual(self._kinds(task), [BAD_REGION])
+
+        task = Task([[[Cube(mark=2), Cube(), Cube(mark=2), Cube(color=5)]]])
+        self.assertEqual(self._kinds(task), [BAD_REGION])
+
+        task = Task([[[Cube(mark=3, color=0), Cube(color=0), Cube()],
+                      [Cube(mark=3), Cube(), Cube()]]])
+        self.assertEqual(self._kinds(task), [])
+
+
+class ConsoleSolverTest(unittest.TestCase):
+    def test_solve_puzzle(self):
+        with tempfile.TemporaryDirectory() as folder:
+            puzzle_path = os.path.join(folder, 'puzzle.txt')
+            solution_path = os.path.join(folder, 'solution.txt')
+            with open(puzzle_path, 'w') as f:
+                f.write('-\t9*\t-\n6*\t-\t-\n\n-\t-\t-\n-\t-\t-\n\n'
+                        '-\t-\t-\n-\t-\t3*')
+
+            with open(solution_path, 'w') as f:
+                f.write('2*\t-\t-')
+            with self.assertRaises(ValueError):
+                shikaku_console_solver.solve_puzzle(
+                    solution_path, solution_path)
+
+            self.assertIs(shikaku_console_solver.solve_puzzle(
+                puzzle_path, solution_path, timeout=0), UNKNOWN)
+            for engine in ('backtracking', 'dlx'):
+                self.assertTrue(shikaku_console_solver.solve_puzzle(
+                    puzzle_path, solution_path, engine))
+                with open(solution_path) as f:
+                    task = Task.fromstr(f.read())
+                for x in range(task.size_x):
+                    for y in range(task.size_y):
+                        for z in range(task.size_z):
+                            self.assertTrue(
+                                task.field[x][y][z].is_colored())
+
+
+class BatchGeneratorTest(unittest.TestCase):
+    def test_generate_batch(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_path = os.path.join(folder, 'batch', 'puzzles.jsonl')
+            shikaku_generator.generate_batch(3, 2, 2, 6, output_path,
+                                             jobs=2, seed=7)
+            with open(output_path, encoding='utf-8') as f:
+                items = [json.loads(line) for line in f]
+
+        self.assertEqual(sorted(item['index'] for item in items),
+                         list(range(6)))
+        for item in items:
+            self.assertEqual(item['seed'],
+                             shikaku_generator.item_seed(7, item['index']))
+            puzzle, solution = Generator(item['seed']).generate(
+                *item['size'])
+            self.assertEqual(item['puzzle'], str(puzzle))
+            self.assertEqual(item['solution'], str(solution))
+
+    def test_seed(self):
+        first, _ = Generator('seed').generate(5, 5, 5)
+        second, _ = Generator('seed').generate(5, 5, 5)
+        self.assertEqual(str(first), str(second))
+
+
 if __name__ == '__main__':
     unittest.main()